@@ -21,6 +21,7 @@
 # Exit information allows the AIs to decide whether they should exit or not.
 
 import navigation
+import timing
 
 
 class AI:
@@ -69,14 +70,20 @@ class AI:
             self.ai_map.swap_bot()
             return "U", self.ai_map
         
+        # Each phase of the turn is timed when the run is being profiled.
+        profile = timing.current()
+        start = profile.clock()
 		# Uses percepts to add to map.
         self.ai_map.scan(percepts)
+        start = profile.lap("nav.scan", start)
         # Figures out which tiles to prioritize. If the current map is cleared:
-		# First, if ALL maps are cleared, attempts to enter a portal that leads to a new world.
-        # Second, it attempts to enter the least-used portal that has a known destination.
+		# First, it takes the shortest route through known portals to a map that still has frontiers.
+        # Only if no such map can be reached does it enter a portal that leads to a new world.
         self.ai_map.add_frontier()
+        start = profile.lap("nav.add_frontier", start)
         # Displays the map.
         self.ai_map.print_map()
+        start = profile.lap("nav.print_map", start)
         # If the number of turns is running out, the AI attempts to leave.
         if self.max_turns and self.max_turns - self.turn < 100:
             self.ai_map.exit_check()
@@ -84,7 +91,7 @@ class AI:
             self.ai_map.exit_check()
         # Gets the next movement direction.
         d = self.ai_map.next_direction(percepts["X"][0])
-        # If the other AI hasn't left already, its turn swaps.
-        if not self.ai_map.single:
-            self.ai_map.swap_bot()
+        profile.lap("nav.discover", start)
+        # The turn passes to the next bot that hasn't left.
+        self.ai_map.swap_bot()
         return d, self.ai_map
\ No newline at end of file
@@ -0,0 +1,318 @@
+import argparse
+import collections
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+import navigation
+import sim
+import simlog
+import timing
+import worldgen
+
+# Times the hot paths of the sim and the navigation code on generated
+# worlds of several sizes and layouts, and compares the times with a
+# baseline saved from an earlier run.
+#
+# The navigation cases run on a map built the way the AIs build theirs:
+# scanned from the cells nearest the start first, so that the known area is
+# connected and has frontiers around its edge.
+
+# Operations timed together as one sample, for the cases that take about a
+# microsecond, where reading the clock around each call would swamp them.
+BATCH = 100
+
+# Cells scanned into the map for the discover and path cases, at most.
+MAX_SCANNED = 20000
+
+# The number of destinations the path case asks for, like the portals and
+# exit that the AIs route to over and over.
+PATH_ENDS = 4
+
+# A result is reported as a regression when its median time is this much
+# slower than the baseline's.
+DEFAULT_THRESHOLD = 0.25
+
+
+def open_cells(the_world, count, rng):
+    cells = []
+    while len(cells) < count:
+        x = rng.randrange(the_world.width)
+        y = rng.randrange(the_world.height)
+        if the_world.is_cell_enterable(x, y):
+            cells.append((x, y))
+    return cells
+
+
+# The open cells reachable on foot from agent A's start, nearest first.
+def explored_cells(the_world, limit):
+    start = the_world.get_startxyA()
+    seen = {start}
+    order = []
+    queue = collections.deque([start])
+    while queue and len(order) < limit:
+        x, y = queue.popleft()
+        order.append((x, y))
+        for dx, dy in sim.DIRECTIONS.values():
+            cell = (x + dx, y + dy)
+            if cell not in seen and the_world.is_cell_enterable(*cell):
+                seen.add(cell)
+                queue.append(cell)
+    return order
+
+
+def bench_percepts(the_world, samples, rng):
+    histogram = timing.Histogram()
+    cells = open_cells(the_world, BATCH, rng)
+    for i in range(samples):
+        start = time.perf_counter()
+        for x, y in cells:
+            sim.get_percepts(the_world, x, y, 'N')
+        histogram.add((time.perf_counter() - start) / BATCH)
+    return histogram
+
+
+# Per agent, for a batch of BATCH agents seen at once.
+def bench_views(the_world, samples, rng):
+    histogram = timing.Histogram()
+    cells = open_cells(the_world, BATCH, rng)
+    xs = [x for x, y in cells]
+    ys = [y for x, y in cells]
+    for i in range(samples):
+        start = time.perf_counter()
+        for view in the_world.views(xs, ys):
+            sim.percepts_from_view(view)
+        histogram.add((time.perf_counter() - start) / BATCH)
+    return histogram
+
+
+def bench_teleport(the_world, samples, rng):
+    histogram = timing.Histogram()
+    x, y = the_world.find_cell('b')
+    for i in range(samples):
+        start = time.perf_counter()
+        for j in range(BATCH):
+            the_world.check_triggers(x, y, 'U')
+        histogram.add((time.perf_counter() - start) / BATCH)
+    return histogram
+
+
+# Each goal is put back after it is triggered, outside of the timing.
+def bench_goal(the_world, samples, rng):
+    histogram = timing.Histogram()
+    goals = [(the_world.find_cell(goal), goal) for goal in sorted(the_world.goals)]
+    for i in range(samples):
+        (x, y), goal = goals[i % len(goals)]
+        start = time.perf_counter()
+        the_world.check_triggers(x, y, 'U')
+        histogram.add(time.perf_counter() - start)
+        the_world.set_cell(x, y, goal)
+        the_world.goals[goal] += 1
+    return histogram
+
+
+def bench_scan(the_world, samples, rng):
+    histogram = timing.Histogram()
+    the_map = navigation.Map()
+    for x, y in explored_cells(the_world, samples):
+        percepts = sim.get_percepts(the_world, x, y, 'N')
+        position = navigation.Coordinates(x, y)
+        start = time.perf_counter()
+        the_map.scan(percepts, position)
+        histogram.add(time.perf_counter() - start)
+        the_map.add_frontier()
+    return histogram
+
+
+def bench_add_frontier(the_world, samples, rng):
+    histogram = timing.Histogram()
+    the_map = navigation.Map()
+    for x, y in explored_cells(the_world, samples):
+        the_map.scan(sim.get_percepts(the_world, x, y, 'N'), navigation.Coordinates(x, y))
+        start = time.perf_counter()
+        the_map.add_frontier()
+        histogram.add(time.perf_counter() - start)
+    return histogram
+
+
+# A map scanned from the nearest half of the cells around the start, or
+# from MAX_SCANNED of them, so that some of it is still to be explored.
+def explored_map(the_world):
+    cells = explored_cells(the_world, 2 * MAX_SCANNED)
+    cells = cells[:len(cells) // 2]
+    the_map = navigation.Map()
+    for x, y in cells:
+        the_map.scan(sim.get_percepts(the_world, x, y, 'N'), navigation.Coordinates(x, y))
+    the_map.add_frontier()
+    return the_map, cells
+
+
+def bench_discover(the_world, samples, rng):
+    histogram = timing.Histogram()
+    the_map, cells = explored_map(the_world)
+    for i in range(samples):
+        position = navigation.Coordinates(*rng.choice(cells))
+        start = time.perf_counter()
+        the_map.discover(position)
+        histogram.add(time.perf_counter() - start)
+    return histogram
+
+
+def bench_path(the_world, samples, rng):
+    histogram = timing.Histogram()
+    the_map, cells = explored_map(the_world)
+    ends = [navigation.Coordinates(*cell) for cell in rng.sample(cells, min(PATH_ENDS, len(cells)))]
+    for i in range(samples):
+        start_position = navigation.Coordinates(*rng.choice(cells))
+        end_position = ends[i % len(ends)]
+        start = time.perf_counter()
+        the_map.get_coord_path_from(start_position, end_position)
+        histogram.add(time.perf_counter() - start)
+    return histogram
+
+
+# Whole turns, AIs included, as timed by the sim itself. The world is
+# generated again for every run, as runs change it.
+def bench_run_sim(make_world, runs, max_turns):
+    profile = timing.Profile()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(runs):
+            sim.run_sim(make_world(), max_turns, simlog.quiet(), profile=profile)
+    return profile.phases["sim.turn"]
+
+
+CASES = {
+    'sim.get_percepts': bench_percepts,
+    'World.views': bench_views,
+    'World.check_triggers.teleport': bench_teleport,
+    'World.check_triggers.goal': bench_goal,
+    'Map.scan': bench_scan,
+    'Map.add_frontier': bench_add_frontier,
+    'Map.discover': bench_discover,
+    'Map.get_coord_path_from': bench_path,
+    'run_sim': None
+}
+
+
+def run_benchmark(cases, layouts, sizes, samples, runs, max_turns, seed):
+    results = []
+    for layout in layouts:
+        for size in sizes:
+            # Two regions, so that there are portals to teleport through.
+            def make_world():
+                return worldgen.generate(size, size, layout, 2, 10, seed)
+            for case in cases:
+                rng = random.Random(seed)
+                if case == 'run_sim':
+                    histogram = bench_run_sim(make_world, runs, max_turns)
+                else:
+                    histogram = CASES[case](make_world(), samples, rng)
+                summary = histogram.summary()
+                results.append({
+                    'case': case,
+                    'layout': layout,
+                    'size': size,
+                    'count': summary['count'],
+                    'mean_ms': summary['mean_ms'],
+                    'p50_ms': summary['p50_ms'],
+                    'p99_ms': summary['p99_ms'],
+                    'per_second': 1000 / summary['mean_ms'] if summary['mean_ms'] else None
+                })
+    return results
+
+
+def result_key(result):
+    return (result['case'], result['layout'], result['size'])
+
+
+# Pairs each result with its baseline, and returns them with the ratio of
+# their median times.
+def compare(results, baseline):
+    base = {result_key(result): result for result in baseline}
+    comparison = []
+    for result in results:
+        before = base.get(result_key(result))
+        ratio = None
+        if before is not None and before['p50_ms']:
+            ratio = result['p50_ms'] / before['p50_ms']
+        comparison.append((result, ratio))
+    return comparison
+
+
+def print_results(comparison, threshold, out):
+    out.write(f"{'case':<32}{'layout':<8}{'size':>6}{'p50 ms':>12}{'p99 ms':>12}{'per s':>12}{'vs base':>10}\n")
+    for result, ratio in comparison:
+        change = ""
+        if ratio is not None:
+            change = f"{ratio:.2f}x"
+            if ratio > 1 + threshold:
+                change += " !"
+        out.write(
+            f"{result['case']:<32}{result['layout']:<8}{result['size']:>6}"
+            f"{result['p50_ms']:>12.4f}{result['p99_ms']:>12.4f}{result['per_second']:>12.0f}{change:>10}\n"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the sim and navigation hot paths, and compare with a baseline."
+    )
+    parser.add_argument(
+        "-c", "--cases", nargs="+", choices=list(CASES), default=list(CASES),
+        help="what to time"
+    )
+    parser.add_argument(
+        "-l", "--layouts", nargs="+", choices=worldgen.LAYOUTS, default=['maze', 'rooms'],
+        help="layouts of the generated worlds"
+    )
+    parser.add_argument(
+        "-s", "--sizes", nargs="+", type=int, default=[32, 128, 512],
+        help="width and height of the generated worlds"
+    )
+    parser.add_argument("-n", "--samples", type=int, default=500, help="samples per case")
+    parser.add_argument("-r", "--runs", type=int, default=2, help="runs of the whole sim per world")
+    parser.add_argument("-t", "--turns", type=int, default=300, help="max turns of each sim run")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the worlds and the sampled cells")
+    parser.add_argument("-o", "--output", default=None, help="save the results as JSON, e.g. as a new baseline")
+    parser.add_argument("-b", "--baseline", default=None, help="results saved by an earlier run to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD,
+        help=f"fraction slower than the baseline that counts as a regression (default: {DEFAULT_THRESHOLD})"
+    )
+    parser.add_argument("--json", action="store_true", help="write the results as JSON to stdout")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.cases, args.layouts, args.sizes, args.samples, args.runs, args.turns, args.seed)
+    report = {'python': platform.python_version(), 'seed': args.seed, 'results': results}
+    if args.output is not None:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+            out.write("\n")
+
+    baseline = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    comparison = compare(results, baseline)
+    regressions = [
+        (result, ratio) for result, ratio in comparison
+        if ratio is not None and ratio > 1 + args.threshold
+    ]
+
+    if args.json:
+        report['regressions'] = [dict(result, ratio=ratio) for result, ratio in regressions]
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print_results(comparison, args.threshold, sys.stdout)
+        if regressions:
+            print(f"{len(regressions)} regressed by more than {args.threshold:.0%}.")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
+import queue
+import threading
+import time
 import pygame
+import palette
+
+# How many turns can be waiting for the display before the oldest
+# are dropped.
+FRAME_QUEUE_SIZE = 64
 
 class Display:
-    def __init__(self, the_world, agent_xA, agent_yA, agent_xB, agent_yB):
+    # agents holds (x, y, facing) for each agent in turn order, with x and y
+    # None once it has exited.
+    def __init__(self, the_world, agents):
         self.cell_size = 20
         self.screen_w = self.cell_size * the_world.get_width()
         self.screen_h = self.cell_size * the_world.get_height()
@@ -10,31 +20,10 @@ class Display:
         self.font_size = self.cell_size - 2
         self.agent_size = self.font_size // 2
         self.font_name = "cmuttr.ttf"
-        self.agent_color = "#FFFFFF"
+        self.agent_color = palette.AGENT_COLOR
         self.agent_facing_color = "#000000"
-        self.color_key = {
-            'w':'#000000',
-            'b':'#0b63d6',
-            'o':'#fc9d03',
-            'r':'#ab3307',
-            'g':'#59eb05',
-            'p':'#c708c4',
-            'y':'#ffff03',
-            '0':'#59eb05',
-            '1':'#59eb05',
-            '2':'#59eb05',
-            '3':'#59eb05',
-            '4':'#59eb05',
-            '5':'#59eb05',
-            '6':'#59eb05',
-            '7':'#59eb05',
-            '8':'#59eb05',
-            '9':'#59eb05',
-        }
-        self.text = [
-            '0', '1', '2', '3', '4',
-            '5', '6', '7', '8', '9'
-        ]
+        self.color_key = palette.CELL_COLORS
+        self.text = palette.TEXT_CELLS
 
         pygame.init()
         self.screen = pygame.display.set_mode(
@@ -42,89 +31,125 @@ class Display:
         )
         self.run = True
         self.world = the_world
-        self.agent_xA = agent_xA
-        self.agent_yA = agent_yA
-        self.agent_xB = agent_xB
-        self.agent_yB = agent_yB
+        self.agents = agents
+        self.names = the_world.AGENT_NAMES
         self.font = pygame.freetype.Font(
-            self.font_name, 
+            self.font_name,
             self.font_size
         )
+        # Rendered text, keyed by the text.
+        self.glyphs = {}
 
-    def update(self, agent_xA, agent_yA, facingA, agent_xB, agent_yB, facingB):
-        for event in pygame.event.get():
-            pass
-
-        self.agent_xA = agent_xA
-        self.agent_yA = agent_yA
-        self.agent_xB = agent_xB
-        self.agent_yB = agent_yB
-        self.screen.fill("black")
+        # The world without the agents, drawn once. Frames copy cells from
+        # it instead of drawing them again.
+        self.background = pygame.Surface((self.screen_w, self.screen_h))
+        self.background.fill(palette.BACKGROUND_COLOR)
         for x in range(0, self.cells_w):
             for y in range(0, self.cells_h):
-                if self.world.is_valid_cell(x, y):
-                    cell = self.world.get_cell(x, y)
-                    pygame.draw.rect(
-                        self.screen,
-                        self.color_key[cell],
-                        pygame.Rect(
-                            x*self.cell_size,
-                            y*self.cell_size,
-                            x*self.cell_size+self.cell_size,
-                            y*self.cell_size+self.cell_size
-                        )
-                    )
-                    if cell in self.text:
-                        surface, rect = self.font.render(cell)
-                        self.screen.blit(
-                            surface,
-                            (
-                                x*self.cell_size + self.cell_size//2 - rect.w//2,
-                                y*self.cell_size + self.cell_size//2 - rect.h//2
-                            )
-                        )
-
-        if self.agent_xA is not None:
-            cxA = self.agent_xA*self.cell_size + self.cell_size//2
-            cyA = self.agent_yA*self.cell_size + self.cell_size//2
-
-            pygame.draw.circle(
-                self.screen,
-                self.agent_color,
-                (cxA, cyA),
-                self.agent_size
-            )
+                self.draw_cell(x, y)
+        # The cells as they were when the background was last brought up to
+        # date, to find the cells that triggers have changed since.
+        self.drawn_cells = bytearray(self.world.grid.cells)
+        self.first_frame = True
 
-            surfaceA, rectA = self.font.render('A')
+    def glyph(self, text):
+        if text not in self.glyphs:
+            self.glyphs[text] = self.font.render(text)
+        return self.glyphs[text]
 
-            self.screen.blit(
-                surfaceA,
-                (
-                    cxA-rectA.w//2,
-                    cyA-rectA.h//2
-                )
-            )
-            
-        if self.agent_xB is not None:
-            cxB = self.agent_xB*self.cell_size + self.cell_size//2
-            cyB = self.agent_yB*self.cell_size + self.cell_size//2
-        
-            pygame.draw.circle(
-                self.screen,
-                self.agent_color,
-                (cxB, cyB),
-                self.agent_size
+    def cell_rect(self, x, y):
+        return pygame.Rect(
+            x*self.cell_size,
+            y*self.cell_size,
+            self.cell_size,
+            self.cell_size
+        )
+
+    # Draws a cell of the world onto the background.
+    def draw_cell(self, x, y):
+        if self.world.is_valid_cell(x, y):
+            cell = self.world.get_cell(x, y)
+            pygame.draw.rect(
+                self.background,
+                self.color_key[cell],
+                self.cell_rect(x, y)
             )
-        
-            surfaceB, rectB = self.font.render('B')
-        
-            self.screen.blit(
-                surfaceB,
-                (
-                    cxB-rectB.w//2,
-                    cyB-rectB.w//2
+            if cell in self.text:
+                surface, rect = self.glyph(cell)
+                self.background.blit(
+                    surface,
+                    (
+                        x*self.cell_size + self.cell_size//2 - rect.w//2,
+                        y*self.cell_size + self.cell_size//2 - rect.h//2
+                    )
                 )
+
+    # Redraws the background under cells that have changed since the last
+    # frame, and returns them.
+    def changed_cells(self):
+        cells = self.world.grid.cells
+        if cells == self.drawn_cells:
+            return []
+        width = self.world.get_width()
+        changed = []
+        for y in range(self.cells_h):
+            start = y * width
+            if cells[start:start + width] != self.drawn_cells[start:start + width]:
+                for x in range(width):
+                    if cells[start + x] != self.drawn_cells[start + x]:
+                        self.draw_cell(x, y)
+                        changed.append((x, y))
+        self.drawn_cells[:] = cells
+        return changed
+
+    def draw_agent(self, agent_x, agent_y, name):
+        cx = agent_x*self.cell_size + self.cell_size//2
+        cy = agent_y*self.cell_size + self.cell_size//2
+
+        pygame.draw.circle(
+            self.screen,
+            self.agent_color,
+            (cx, cy),
+            self.agent_size
+        )
+
+        surface, rect = self.glyph(name)
+
+        self.screen.blit(
+            surface,
+            (
+                cx-rect.w//2,
+                cy-rect.h//2
             )
+        )
+
+    # Keeps the window responsive between frames.
+    def pump(self):
+        for event in pygame.event.get():
+            pass
+
+    def update(self, agents):
+        self.pump()
+
+        # Only the cells the agents have left or entered, and the cells
+        # changed by triggers, need to be drawn again.
+        dirty = set(self.changed_cells())
+        for x, y, facing in self.agents + agents:
+            if x is not None:
+                dirty.add((x, y))
+
+        self.agents = agents
+
+        if self.first_frame:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for x, y in dirty:
+                rect = self.cell_rect(x, y)
+                self.screen.blit(self.background, rect, rect)
+
+        for (x, y, facing), name in zip(self.agents, self.names):
+            if x is not None:
+                self.draw_agent(x, y, name)
 
         # fx = cxA
         # fy = cyA
@@ -142,7 +167,98 @@ class Display:
         #     2
         # )
 
-        pygame.display.flip()
+        if self.first_frame:
+            pygame.display.flip()
+            self.first_frame = False
+        else:
+            pygame.display.update([self.cell_rect(x, y) for x, y in dirty])
 
     def quit(self):
         pygame.quit()
+
+
+# Shows a run live while the sim runs at full speed. SDL needs the window
+# and its events on the main thread (on macOS it refuses anything else), so
+# the window stays on the thread that creates this, and run_beside runs the
+# sim on a worker thread instead. The sim hands over the agents' state each
+# turn without waiting. The display draws at most one frame every
+# frame_time seconds, skipping straight to the newest state it has been
+# given, and drops the oldest states if the queue fills up. Agents are
+# drawn where the sim last put them, while the world's cells are read as
+# they are when the frame is drawn.
+class DisplayLoop:
+    def __init__(self, the_world, frame_time=0.5):
+        self.frame_time = frame_time
+        self.frames = queue.Queue(FRAME_QUEUE_SIZE)
+        self.display = Display(the_world, [])
+
+    def update(self, agents):
+        self.put(agents)
+
+    def put(self, frame):
+        while True:
+            try:
+                self.frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                except queue.Empty:
+                    pass
+
+    # Calls target on a worker thread while the display follows it on this
+    # thread. Returns what target returned, or raises what it raised, once
+    # the last state it handed over has been drawn and the window closed.
+    def run_beside(self, target):
+        outcome = {}
+
+        def work():
+            try:
+                outcome['result'] = target()
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                self.put(None)
+
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+        try:
+            self.follow()
+        finally:
+            self.display.quit()
+        worker.join()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    # Draws the states handed over until the worker is done.
+    def follow(self):
+        disp = self.display
+        next_frame = time.perf_counter()
+        while True:
+            try:
+                frame = self.frames.get(timeout=0.05)
+            except queue.Empty:
+                disp.pump()
+                continue
+            # Everything queued since the last frame is folded into the
+            # newest state.
+            done = frame is None
+            while not done:
+                try:
+                    newer = self.frames.get_nowait()
+                except queue.Empty:
+                    break
+                if newer is None:
+                    done = True
+                    break
+                frame = newer
+            if frame is not None:
+                disp.update(frame)
+            if done:
+                return
+            next_frame += self.frame_time
+            while time.perf_counter() < next_frame:
+                disp.pump()
+                time.sleep(min(0.05, max(0, next_frame - time.perf_counter())))
+            next_frame = max(next_frame, time.perf_counter())
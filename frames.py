@@ -0,0 +1,300 @@
+# Headless export of simulation runs as images, without pygame.
+#
+# Frames are drawn in the display's colours straight from the world grid
+# into an RGB canvas, and written either as one PNG per frame or as a
+# single animated PNG (APNG). The world is drawn once; each frame only
+# redraws the cells the agents left or entered and the cells triggers
+# changed. In an animated PNG, each frame after the first stores just the
+# rectangle around those cells.
+#
+# Only every Nth turn needs to be drawn, so long runs, especially when
+# replayed, export quickly.
+
+import argparse
+import os
+import struct
+import zlib
+import palette
+import world
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# 3x5 pixel glyphs for the text drawn on cells and agents.
+GLYPHS = {
+    '0': ['111', '101', '101', '101', '111'],
+    '1': ['010', '110', '010', '010', '111'],
+    '2': ['111', '001', '111', '100', '111'],
+    '3': ['111', '001', '111', '001', '111'],
+    '4': ['101', '101', '111', '001', '001'],
+    '5': ['111', '100', '111', '001', '111'],
+    '6': ['111', '100', '111', '101', '111'],
+    '7': ['111', '001', '001', '001', '001'],
+    '8': ['111', '101', '111', '101', '111'],
+    '9': ['111', '101', '111', '001', '111'],
+    'A': ['010', '101', '111', '101', '101'],
+    'B': ['110', '101', '110', '101', '110'],
+    'C': ['011', '100', '100', '100', '011'],
+    'D': ['110', '101', '101', '101', '110'],
+    'E': ['111', '100', '110', '100', '111'],
+    'F': ['111', '100', '110', '100', '100'],
+    'G': ['011', '100', '101', '101', '011'],
+    'H': ['101', '101', '111', '101', '101'],
+    'I': ['111', '010', '010', '010', '111'],
+    'J': ['001', '001', '001', '101', '010'],
+    'K': ['101', '101', '110', '101', '101'],
+    'L': ['100', '100', '100', '100', '111'],
+    'M': ['101', '111', '111', '101', '101'],
+    'N': ['110', '101', '101', '101', '101'],
+    'O': ['010', '101', '101', '101', '010'],
+    'P': ['110', '101', '110', '100', '100'],
+    'Q': ['010', '101', '101', '110', '011'],
+    'R': ['110', '101', '110', '101', '101'],
+    'S': ['011', '100', '010', '001', '110'],
+    'T': ['111', '010', '010', '010', '010'],
+    'U': ['101', '101', '101', '101', '111'],
+    'V': ['101', '101', '101', '101', '010'],
+    'W': ['101', '101', '111', '111', '101'],
+    'X': ['101', '101', '010', '101', '101'],
+    'Y': ['101', '101', '010', '010', '010'],
+    'Z': ['111', '001', '010', '100', '111'],
+}
+
+
+# An argparse type for how often frames are drawn.
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive int: {text}")
+    return value
+
+
+def chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def header(width, height):
+    # 8 bit RGB, no interlacing.
+    return chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+
+class FrameRenderer:
+
+    def __init__(self, the_world, cell_size=20):
+        self.world = the_world
+        self.cell_size = cell_size
+        self.width = the_world.get_width() * cell_size
+        self.height = the_world.get_height() * cell_size
+        self.row_bytes = self.width * 3
+        # Pixel rows of a cell, keyed by the cell code, or by the cell code
+        # and agent name for a cell with an agent on it.
+        self.tiles = {}
+
+        self.base = bytearray(self.row_bytes * self.height)
+        for y in range(the_world.get_height()):
+            for x in range(the_world.get_width()):
+                self.draw_cell(self.base, x, y, self.tile(the_world.grid.cells[y * the_world.get_width() + x]))
+        self.canvas = bytearray(self.base)
+        self.drawn_cells = bytearray(the_world.grid.cells)
+        self.agents = []
+
+    def tile(self, code, agent=None):
+        key = (code, agent)
+        if key not in self.tiles:
+            size = self.cell_size
+            cell = chr(code)
+            pixels = [bytearray(palette.rgb(palette.CELL_COLORS.get(cell, palette.BACKGROUND_COLOR)) * size) for i in range(size)]
+            if cell in palette.TEXT_CELLS:
+                self.draw_text(pixels, cell)
+            if agent is not None:
+                self.draw_agent(pixels, agent)
+            self.tiles[key] = [bytes(row) for row in pixels]
+        return self.tiles[key]
+
+    def draw_text(self, pixels, text):
+        scale = max(1, self.cell_size // 8)
+        glyph = GLYPHS[text]
+        left = (self.cell_size - 3 * scale) // 2
+        top = (self.cell_size - 5 * scale) // 2
+        color = palette.rgb(palette.TEXT_COLOR)
+        for gy, line in enumerate(glyph):
+            for gx, bit in enumerate(line):
+                if bit == '1':
+                    for y in range(top + gy * scale, top + (gy + 1) * scale):
+                        start = (left + gx * scale) * 3
+                        pixels[y][start:start + scale * 3] = color * scale
+
+    def draw_agent(self, pixels, agent):
+        radius = max(1, (self.cell_size - 2) // 2)
+        center = self.cell_size / 2
+        color = palette.rgb(palette.AGENT_COLOR)
+        for y in range(self.cell_size):
+            for x in range(self.cell_size):
+                if (x + 0.5 - center) ** 2 + (y + 0.5 - center) ** 2 <= radius * radius:
+                    pixels[y][x * 3:x * 3 + 3] = color
+        self.draw_text(pixels, agent)
+
+    def draw_cell(self, image, x, y, tile):
+        size = self.cell_size
+        start = y * size * self.row_bytes + x * size * 3
+        for row in tile:
+            image[start:start + size * 3] = row
+            start += self.row_bytes
+
+    def copy_cell(self, x, y):
+        size = self.cell_size
+        start = y * size * self.row_bytes + x * size * 3
+        for i in range(size):
+            self.canvas[start:start + size * 3] = self.base[start:start + size * 3]
+            start += self.row_bytes
+
+    # Brings the canvas up to date with the world and the agents, and
+    # returns the cells that changed.
+    def update(self, agents):
+        dirty = set()
+        cells = self.world.grid.cells
+        width = self.world.get_width()
+        if cells != self.drawn_cells:
+            for y in range(self.world.get_height()):
+                start = y * width
+                if cells[start:start + width] != self.drawn_cells[start:start + width]:
+                    for x in range(width):
+                        if cells[start + x] != self.drawn_cells[start + x]:
+                            self.draw_cell(self.base, x, y, self.tile(cells[start + x]))
+                            dirty.add((x, y))
+            self.drawn_cells[:] = cells
+        for x, y, name in self.agents:
+            dirty.add((x, y))
+        self.agents = [(x, y, name) for x, y, name in agents if x is not None]
+        for x, y in dirty:
+            self.copy_cell(x, y)
+        for x, y, name in self.agents:
+            self.draw_cell(self.canvas, x, y, self.tile(cells[y * width + x], name))
+            dirty.add((x, y))
+        return dirty
+
+    # The pixel rectangle (x, y, width, height) around a set of cells.
+    def bounds(self, dirty):
+        size = self.cell_size
+        min_x = min(x for x, y in dirty)
+        max_x = max(x for x, y in dirty)
+        min_y = min(y for x, y in dirty)
+        max_y = max(y for x, y in dirty)
+        return (min_x * size, min_y * size, (max_x - min_x + 1) * size, (max_y - min_y + 1) * size)
+
+    # Compressed image data for a rectangle of the canvas.
+    def encode(self, x, y, width, height):
+        rows = []
+        start = y * self.row_bytes + x * 3
+        for i in range(height):
+            rows.append(b'\x00')
+            rows.append(self.canvas[start:start + width * 3])
+            start += self.row_bytes
+        return zlib.compress(b''.join(rows))
+
+    def png(self):
+        return (
+            PNG_SIGNATURE
+            + header(self.width, self.height)
+            + chunk(b'IDAT', self.encode(0, 0, self.width, self.height))
+            + chunk(b'IEND', b'')
+        )
+
+
+# Writes one frame per sampled turn to an animated PNG.
+class AnimatedWriter:
+
+    def __init__(self, filename, renderer, delay_ms):
+        self.renderer = renderer
+        self.delay_ms = delay_ms
+        self.frames = 0
+        self.sequence = 0
+        self.file = open(filename, 'wb')
+        self.file.write(PNG_SIGNATURE + header(renderer.width, renderer.height))
+        # The frame count is filled in on close.
+        self.actl_offset = self.file.tell()
+        self.file.write(chunk(b'acTL', struct.pack('>II', 0, 0)))
+
+    def frame_control(self, x, y, width, height):
+        data = struct.pack('>IIIIIHHBB', self.sequence, width, height, x, y, self.delay_ms, 1000, 0, 0)
+        self.sequence += 1
+        return chunk(b'fcTL', data)
+
+    def write(self, dirty):
+        renderer = self.renderer
+        if self.frames == 0:
+            self.file.write(self.frame_control(0, 0, renderer.width, renderer.height))
+            self.file.write(chunk(b'IDAT', renderer.encode(0, 0, renderer.width, renderer.height)))
+        else:
+            if not dirty:
+                # Nothing changed, so the previous frame is shown for longer.
+                dirty = {(0, 0)}
+            x, y, width, height = renderer.bounds(dirty)
+            self.file.write(self.frame_control(x, y, width, height))
+            data = struct.pack('>I', self.sequence) + renderer.encode(x, y, width, height)
+            self.sequence += 1
+            self.file.write(chunk(b'fdAT', data))
+        self.frames += 1
+
+    def close(self):
+        self.file.write(chunk(b'IEND', b''))
+        self.file.seek(self.actl_offset)
+        self.file.write(chunk(b'acTL', struct.pack('>II', self.frames, 0)))
+        self.file.close()
+
+
+# Writes each sampled turn as its own PNG in a directory.
+class PngWriter:
+
+    def __init__(self, directory, renderer):
+        self.directory = directory
+        self.renderer = renderer
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, turn):
+        with open(os.path.join(self.directory, f"turn_{turn:06d}.png"), 'wb') as f:
+            f.write(self.renderer.png())
+
+
+# Takes the place of a display in run_sim. Every turn is tracked, but only
+# every Nth is drawn and written, along with the first and the last.
+#
+# output ending in .png or .apng is written as an animated PNG; anything
+# else is a directory to write one PNG per frame into.
+class FrameExporter:
+
+    def __init__(self, the_world, output, every=1, cell_size=20, delay_ms=100):
+        if every < 1:
+            raise ValueError(f"Frames can only be drawn every 1 or more turns, not every {every}.")
+        self.every = every
+        self.renderer = FrameRenderer(the_world, cell_size)
+        if output.lower().endswith((".png", ".apng")):
+            self.animated = AnimatedWriter(output, self.renderer, delay_ms)
+            self.pngs = None
+        else:
+            self.animated = None
+            self.pngs = PngWriter(output, self.renderer)
+        self.turn = -1
+        self.state = None
+        self.written_turn = None
+
+    # agents is what run_sim hands a display: (x, y, facing) for each agent
+    # in turn order.
+    def update(self, agents):
+        self.turn += 1
+        self.state = [(x, y, name) for (x, y, facing), name in zip(agents, world.World.AGENT_NAMES)]
+        if self.turn % self.every == 0:
+            self.write()
+
+    def write(self):
+        dirty = self.renderer.update(self.state)
+        if self.animated is not None:
+            self.animated.write(dirty)
+        else:
+            self.pngs.write(self.turn)
+        self.written_turn = self.turn
+
+    def close(self):
+        if self.state is not None and self.written_turn != self.turn:
+            self.write()
+        if self.animated is not None:
+            self.animated.close()
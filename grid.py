@@ -0,0 +1,77 @@
+# Compact storage for a world map.
+#
+# Each cell is stored as one byte in a flat row-major bytearray. A cell's
+# code is the byte value of its map character, so whole rows and columns
+# can be sliced straight out of the array and decoded back into map text.
+
+# Cell code -> map character.
+CELLS = [chr(code) for code in range(256)]
+
+
+def cell_code(flag):
+    return ord(flag)
+
+
+class Grid:
+
+    def __init__(self, width, height, cells=None):
+        self.width = width
+        self.height = height
+        if cells is None:
+            cells = bytearray(width * height)
+        elif len(cells) != width * height:
+            raise ValueError(
+                f"Grid of {width}x{height} needs {width * height} cells, got {len(cells)}."
+            )
+        self.cells = cells
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def index(self, x, y):
+        return y * self.width + x
+
+    def coords(self, index):
+        return (index % self.width, index // self.width)
+
+    def check_bounds(self, x, y):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError(
+                f"Cell {x},{y} is outside the {self.width}x{self.height} grid."
+            )
+
+    def get(self, x, y):
+        self.check_bounds(x, y)
+        return CELLS[self.cells[y * self.width + x]]
+
+    def set(self, x, y, flag):
+        self.check_bounds(x, y)
+        self.cells[y * self.width + x] = ord(flag)
+
+    # Bulk accessors. Each returns map text, one character per cell.
+
+    def row(self, y):
+        if not 0 <= y < self.height:
+            raise IndexError(f"Row {y} is outside the {self.width}x{self.height} grid.")
+        start = y * self.width
+        return self.cells[start:start + self.width].decode('ascii')
+
+    def column(self, x):
+        if not 0 <= x < self.width:
+            raise IndexError(f"Column {x} is outside the {self.width}x{self.height} grid.")
+        return self.cells[x::self.width].decode('ascii')
+
+    def rect(self, x, y, width, height):
+        if width < 0 or height < 0:
+            raise ValueError(f"Rectangle size must not be negative: {width}x{height}")
+        if width and height:
+            self.check_bounds(x, y)
+            self.check_bounds(x + width - 1, y + height - 1)
+        rows = []
+        for row_y in range(y, y + height):
+            start = row_y * self.width + x
+            rows.append(self.cells[start:start + width].decode('ascii'))
+        return rows
+
+    def rows(self):
+        return [self.row(y) for y in range(self.height)]
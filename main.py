@@ -1,7 +1,11 @@
 import sys
-import world
+import worldfile
 import misc
+import frames
+import replay
 import sim
+import simlog
+import timing
 
 def main():
 
@@ -12,6 +16,11 @@ def main():
     the_world = None
     use_display = False
     display_speed = 0.5
+    profile = None
+    profile_filename = None
+    replay_filename = None
+    frames_filename = None
+    frames_every = 1
 
     args = sys.argv
 
@@ -34,10 +43,26 @@ def main():
                     display_speed = float(args[i+1])
                 except:
                     pass
+            elif args[i] == "-p":
+                profile = timing.Profile()
+                if i + 1 < len(args) and not args[i+1].startswith("-"):
+                    profile_filename = args[i+1]
+            elif args[i] == "-r":
+                replay_filename = args[i+1]
+            elif args[i] == "-x":
+                frames_filename = args[i+1]
+            elif args[i] == "-n":
+                try:
+                    frames_every = int(args[i+1])
+                    if frames_every < 1:
+                        raise ValueError
+                except ValueError:
+                    frames_every = 1
+                    print(f"frames every must be a positive int: {args[i+1]}")
             elif args[i] == "-t":
                 try:
                     max_turns = int(args[i+1])
-                except TypeError:
+                except ValueError:
                     print(f"max turns must be an int: {args[i+1]}")
         except IndexError:
             print("Incorrect command line arguments. Run with -h for help.")
@@ -46,17 +71,33 @@ def main():
         i+=1
 
     if log_filename is not None:
-        log = open(log_filename, 'w')
+        log_file = open(log_filename, 'w')
+        log = simlog.SimLog(log_file, "jsonl" if log_filename.endswith(".jsonl") else "text")
         
     try:
-        the_world = world.World(world_filename)
-        the_world.load_world()
-        sim.run_sim(the_world, max_turns, log, use_display, display_speed)
+        the_world = worldfile.load(world_filename, use_cache=False)
+        recorder = None
+        if replay_filename is not None:
+            recorder = replay.Recorder(the_world, max_turns)
+        exporter = None
+        if frames_filename is not None:
+            exporter = frames.FrameExporter(the_world, frames_filename, frames_every)
+        sim.run_sim(the_world, max_turns, log, use_display, display_speed, profile=profile, recorder=recorder, frames=exporter)
+        if recorder is not None:
+            recorder.write(replay_filename)
+        if profile_filename is not None:
+            with open(profile_filename, 'w') as out:
+                profile.write_json(out)
+        elif profile is not None:
+            print(profile.format_report())
     except misc.InvalidCellException as e:
         print(e)
+    except FileNotFoundError:
+        print(f"{world_filename} was not found.")
     finally:
         if log is not None:
             log.close()
+            log_file.close()
 
 
 
@@ -1,4 +1,8 @@
+import collections
+import heapq
 import string
+import search
+import timing
 
 # Class that bundles together coordinate pairs.
 class Coordinates(object):
@@ -12,275 +16,223 @@ class Coordinates(object):
 	def __eq__(self, other):
 		return (self.x == other.x) and (self.y == other.y)
 
-# Abstract class that is a parent to all tiles.
-# Defines behavior for how they are displayed on the map.
-class Tile(object):
-	def __init__(self):
-		self.tile_marker: str = "T" # tile_marker is the symbol that will be used when displayed on the map.
-		
-	def __str__(self):
-		return self.tile_marker
+# Tile kinds stored in a Map. Each kind is the byte of the character it is displayed as on the map.
+UNKNOWN = ord("?") # Positions that have not been seen, but are known to exist. Adjacent walkable tiles become frontiers.
+WALL = ord("w") # An area that the AI cannot walk on.
+GRASS = ord("g") # A walkable map tile.
+EXIT = ord("r") # The exit, and ultimate objective of the AI.
+FRONTIER_MARKER = ord("f") # How walkable tiles that are frontiers are displayed.
+# Numbered goal tiles are stored as their digit, and teleporters as o, b, p, or y. Both are walkable.
 
-# Fills in positions on the map that have not been seen, but are known to exist.
-# Adjacent grass tiles become frontiers.
-class Unknown_Tile(Tile):
-	def __init__(self):
-		self.tile_marker: str = "?"
-		#❔
+# True for every kind the AI can walk on.
+WALKABLE = bytes(0 if kind in (UNKNOWN, WALL) else 1 for kind in range(256))
+
+# How many distance fields each map keeps cached.
+MAX_DISTANCE_FIELDS = 8
 
-# Represents an area that the AI cannot walk on.
-class Wall_Tile(Tile):
-	def __init__(self):
-		self.tile_marker: str = "w"
-		#⬛
-		
-# A walkable map tile.
-# Contains a visited properties to prevent remapping the same position.
-class Grass_Tile(Tile):
-	def __init__(self, visited=False):
-		self.tile_marker: str = "g"
-		self.frontier = False
-		#⬜
-		
-	def __str__(self):
-		if not self.frontier:
-			return self.tile_marker
-		return "f"
-		
-# The exit, and ultimate objective of the AI.
-class Exit_Tile(Grass_Tile):
-	def __init__(self):
-		self.tile_marker: str = "r"
-		self.frontier = False
-		#🟥
-		
-# A numbered goal tile. It is identifiable on the map with a digit.
-class Goal_Tile(Grass_Tile):
-	def __init__(self, digit):
-		self.tile_marker = digit
-		self.frontier = False
-		
-# A teleporter tile. Identifiable on the map as o, b, p, or y.
-class Teleporter_Tile(Grass_Tile):
-	def __init__(self, color):
-		self.tile_marker = color
-		self.frontier = False
-		
 # Keeps track of where everything is.
 # Expands and changes based on the AI's discoveries.
+# Positions on a map are logical coordinates relative to where the map was first entered, and never change as the map grows.
+# Tiles are stored in a flat, row-major bytearray of kinds.
+# The storage covers a window of logical coordinates starting at (origin_x, origin_y), and doubles in size whenever the known area outgrows it.
 class Map(object):
 	def __init__(self):
-		self.map_height: int = 1
-		self.map_width: int = 1
-		self.tile_map = [[Unknown_Tile()]] # This is the 2D array that stores the bulk of mapping information.
+		self.min_x: int = 0 # The bounds of the area that has been seen so far, in logical coordinates.
+		self.max_x: int = 0
+		self.min_y: int = 0
+		self.max_y: int = 0
+		self.origin_x: int = -1 # The logical coordinates of the first stored tile.
+		self.origin_y: int = -1
+		self.stride: int = 3 # The width of the storage window.
+		self.rows: int = 3 # The height of the storage window.
+		self.tiles = bytearray([UNKNOWN]) * (self.stride * self.rows) # The kind of every tile on the map. This stores the bulk of mapping information.
+		self.frontiers = set() # The index of every walkable tile that is next to an unknown tile.
+		self.changed = set() # Tiles whose frontier status may have changed since add_frontier last ran.
 		self.fully_explored: bool = False # When the map is fully explored (no more frontiers), this is set to true.
+		self.search = search.GridSearch() # Runs the path searches over this map's tiles.
+		self.fields = collections.OrderedDict() # Cached distance fields, keyed by the index of their source tile. The most recently used are last.
+
+	@property
+	def map_width(self):
+		return self.max_x - self.min_x + 1
+
+	@property
+	def map_height(self):
+		return self.max_y - self.min_y + 1
+
+	# Converts logical coordinates on the map to an index into self.tiles.
+	def index(self, x: int, y: int):
+		return (y - self.origin_y) * self.stride + (x - self.origin_x)
+
+	# Converts an index into self.tiles back to logical coordinates.
+	def coordinates(self, index: int):
+		return Coordinates(index % self.stride + self.origin_x, index // self.stride + self.origin_y)
+
+	# Makes sure the storage holds the given logical area, plus a border of unknown tiles around it.
+	# The border means walkable tiles never sit on the edge of the storage, so neighbouring indices are always in range.
+	# When the storage has to grow, it at least doubles along that axis so that growth is amortized.
+	def grow_to_fit(self, min_x: int, max_x: int, min_y: int, max_y: int):
+		self.min_x = min(self.min_x, min_x)
+		self.max_x = max(self.max_x, max_x)
+		self.min_y = min(self.min_y, min_y)
+		self.max_y = max(self.max_y, max_y)
+		needed_min_x = min(self.origin_x, self.min_x - 1)
+		needed_max_x = max(self.origin_x + self.stride - 1, self.max_x + 1)
+		needed_min_y = min(self.origin_y, self.min_y - 1)
+		needed_max_y = max(self.origin_y + self.rows - 1, self.max_y + 1)
+		needed_width = needed_max_x - needed_min_x + 1
+		needed_height = needed_max_y - needed_min_y + 1
+		if needed_width == self.stride and needed_height == self.rows:
+			return
 
-	# Expands self.tile_map along the x axis in either direction.
-	# Negative values expand West, positive values expand East.
-	def expand_x(self, distance: int, current_bot_position):
-		for index, row in enumerate(self.tile_map):
-			# Case for postive values. Expands the map East by {distance} tiles.
-			if distance > 0:
-				self.tile_map[index] = row + ([Unknown_Tile()] * distance)
-			# Case for negative values. Expands the map West by {distance} tiles.
-			elif distance < 0:
-				self.tile_map[index] = ([Unknown_Tile()] * abs(distance)) + row
-		# Corrects all positions on the map if the map was expanded on the West.
-		if distance < 0:
-			for i in bot_coordinates:
-				if current_bot_position.world == i.world:
-					i.x += abs(distance)
-			for i in unique_tile_locations.values():
-				if i and current_bot_position.world == i.world:
-					i.x += abs(distance)
-			if exit_location and exit_location.world == current_bot_position.world:
-				exit_location.x += abs(distance)
-		self.map_width += abs(distance)
-
-	# Expands self.tile_map along the y axis in either direction.
-	# Negative values expand North, positve values expand South.
-	def expand_y(self, distance: int, current_bot_position):
-		new_space = []
-		# Prepares the tiles that will be added to the map.
-		for i in range(abs(distance)):
-			new_space.append([Unknown_Tile()] * self.map_width)
-		# Adds tiles at the south if distance is positive.
-		if distance > 0:
-			self.tile_map += new_space
-		# Adds tiles at the north if distance is negative.
-		elif distance < 0:
-			self.tile_map = new_space + self.tile_map
-			# Corrects all positions on the map if map was expanded north.
-			for i in bot_coordinates:
-				if current_bot_position.world == i.world:
-					i.y += abs(distance)
-			for i in unique_tile_locations.values():
-				if i and current_bot_position.world == i.world:
-					i.y += abs(distance)
-			if exit_location and exit_location.world == current_bot_position.world:
-				exit_location.y += abs(distance)
-		self.map_height += abs(distance)
+		stride = self.stride
+		origin_x = self.origin_x
+		if needed_width > self.stride:
+			stride = max(needed_width, self.stride * 2)
+			# The spare room is split between both sides.
+			origin_x = needed_min_x - (stride - needed_width) // 2
+		rows = self.rows
+		origin_y = self.origin_y
+		if needed_height > self.rows:
+			rows = max(needed_height, self.rows * 2)
+			origin_y = needed_min_y - (rows - needed_height) // 2
+
+		tiles = bytearray([UNKNOWN]) * (stride * rows)
+		offset = (self.origin_y - origin_y) * stride + (self.origin_x - origin_x)
+		for y in range(self.rows):
+			old_start = y * self.stride
+			new_start = offset + y * stride
+			tiles[new_start:new_start + self.stride] = self.tiles[old_start:old_start + self.stride]
+		# Indices of stored tiles move with the storage.
+		old_stride = self.stride
+		def moved(index):
+			return offset + (index // old_stride) * stride + index % old_stride
+		self.frontiers = {moved(index) for index in self.frontiers}
+		self.changed = {moved(index) for index in self.changed}
+		self.tiles = tiles
+		# Cached distance fields are indexed by the old storage, so they are dropped.
+		self.fields.clear()
+		self.stride = stride
+		self.rows = rows
+		self.origin_x = origin_x
+		self.origin_y = origin_y
 	
 	# Prints the map in an easy to read format.
 	def print_map(self):
-		for y in self.tile_map:
-			for x in y:
-				print(x, end="")
-			print()
-			
-	# Returns a new tile based on characters found in the percepts.
-	def charToTile(self, character):
-		if character == "g":
-			return Grass_Tile()
-		elif character == "w":
-			return Wall_Tile()
-		elif character == "r":
-			return Exit_Tile()
-		elif character in string.digits:
-			return Goal_Tile(character)
-		elif character in "obpy":
-			return Teleporter_Tile(character)
-	
+		marked = bytearray(self.tiles)
+		for index in self.frontiers:
+			marked[index] = FRONTIER_MARKER
+		for y in range(self.min_y, self.max_y + 1):
+			start = self.index(self.min_x, y)
+			print(marked[start:start + self.map_width].decode("ascii"))
+
+	# The slice of self.tiles covering {length} tiles in a straight line from a tile, not including the tile itself.
+	# step is the index offset between neighbouring tiles in that direction.
+	def ray_slice(self, index: int, step: int, length: int):
+		stop = index + step * (length + 1)
+		return slice(index + step, stop if stop >= 0 else None, step)
+
 	# Adds newly discovered tiles to the map.
+	# Each direction's percepts are written into the map as a single slice.
 	def scan(self, percepts, current_bot_position):
 		robot_x = current_bot_position.x
 		robot_y = current_bot_position.y
-		self.tile_map[robot_y][robot_x] = self.charToTile(percepts["X"][0])
-		# x_distance are the distance from where the robot is to the edge of the map.
-		north_distance = robot_y
-		east_distance = (self.map_width - 1) - robot_x
-		south_distance = (self.map_height - 1) - robot_y
-		west_distance = robot_x
-		# Checks if expanding North is necessary, and expands if needed.
-		if len(percepts["N"]) > north_distance:
-			self.expand_y(north_distance - len(percepts["N"]), current_bot_position)
-		# Places tiles in a row starting from the robot's position.
-		tile_placement_offset = 0
-		for i in percepts["N"]:
-			tile_placement_offset -= 1
-			if isinstance(self.tile_map[current_bot_position.y + tile_placement_offset][current_bot_position.x], Unknown_Tile):
-				self.tile_map[current_bot_position.y + tile_placement_offset][current_bot_position.x] = self.charToTile(i)
-		# Checks if expanding East is necessary, and expands if needed.
-		if len(percepts["E"]) > east_distance:
-			self.expand_x(len(percepts["E"]) - east_distance, current_bot_position)
-		# Places tiles in a row starting from the robot's position.
-		tile_placement_offset = 0
-		for i in percepts["E"]:
-			tile_placement_offset += 1
-			if isinstance(self.tile_map[current_bot_position.y][current_bot_position.x + tile_placement_offset], Unknown_Tile):
-				self.tile_map[current_bot_position.y][current_bot_position.x + tile_placement_offset] = self.charToTile(i)
-		# Checks if expanding South is necessary, and expands if needed.
-		if len(percepts["S"]) > south_distance:
-			self.expand_y(len(percepts["S"]) - south_distance, current_bot_position)
-		# Places tiles in a row starting from the robot's position.
-		tile_placement_offset = 0
-		for i in percepts["S"]:
-			tile_placement_offset += 1
-			if isinstance(self.tile_map[current_bot_position.y + tile_placement_offset][current_bot_position.x], Unknown_Tile):
-				self.tile_map[current_bot_position.y + tile_placement_offset][current_bot_position.x] = self.charToTile(i)
-		# Checks if expanding West is necessary, and expands if needed.
-		if len(percepts["W"]) > west_distance:
-			self.expand_x(west_distance - len(percepts["W"]), current_bot_position)
-		# Places tiles in a row starting from the robot's position.
-		tile_placement_offset = 0
-		for i in percepts["W"]:
-			tile_placement_offset -= 1
-			if isinstance(self.tile_map[current_bot_position.y][current_bot_position.x + tile_placement_offset], Unknown_Tile):
-				self.tile_map[current_bot_position.y][current_bot_position.x + tile_placement_offset] = self.charToTile(i)
+		self.grow_to_fit(
+			robot_x - len(percepts["W"]),
+			robot_x + len(percepts["E"]),
+			robot_y - len(percepts["N"]),
+			robot_y + len(percepts["S"])
+		)
+		robot_index = self.index(robot_x, robot_y)
+		was_unknown = self.tiles[robot_index] == UNKNOWN
+		self.tiles[robot_index] = ord(percepts["X"][0])
+		if was_unknown:
+			self.discovered(robot_index)
+		# Places each row of tiles starting from the robot's position.
+		for direction, step in (("N", -self.stride), ("E", 1), ("S", self.stride), ("W", -1)):
+			if percepts[direction]:
+				ray = self.ray_slice(robot_index, step, len(percepts[direction]))
+				# Only tiles that were unknown until now can change which tiles are frontiers.
+				previous = self.tiles[ray]
+				self.tiles[ray] = "".join(percepts[direction]).encode("ascii")
+				position = previous.find(UNKNOWN)
+				while position != -1:
+					self.discovered(ray.start + position * step)
+					position = previous.find(UNKNOWN, position + 1)
+
+	# Records that a tile was discovered, which may change its own and its neighbours' frontier status.
+	# Cached distance fields are told about it so they can take it in if it is walkable.
+	def discovered(self, index: int):
+		stride = self.stride
+		self.changed.update((index, index - stride, index + 1, index + stride, index - 1))
+		if WALKABLE[self.tiles[index]]:
+			for field in self.fields.values():
+				field.pending.append(index)
 				
-	# Checks grass tiles to see if they qualify as frontiers. Changes their status based on result.
+	# Checks the tiles changed by recent scans to see if they qualify as frontiers. Changes their status based on result.
 	def add_frontier(self):
-		for y, row in enumerate(self.tile_map):
-			for x, tile in enumerate(row):
-				if isinstance(tile, Grass_Tile):
-					if (isinstance(self.tile_map[y-1][x], Unknown_Tile)
-					or isinstance(self.tile_map[y][x+1], Unknown_Tile)
-					or isinstance(self.tile_map[y+1][x], Unknown_Tile)
-					or isinstance(self.tile_map[y][x-1], Unknown_Tile)):
-						tile.frontier = True
-					else:
-						tile.frontier = False
+		tiles = self.tiles
+		stride = self.stride
+		for index in self.changed:
+			if WALKABLE[tiles[index]] and (
+				tiles[index - stride] == UNKNOWN
+				or tiles[index + 1] == UNKNOWN
+				or tiles[index + stride] == UNKNOWN
+				or tiles[index - 1] == UNKNOWN
+			):
+				self.frontiers.add(index)
+			else:
+				self.frontiers.discard(index)
+		self.changed.clear()
 
 	# Returns a list containing the path to the nearest frontier tile.
 	def discover(self, current_bot_position):
-		previous_coords = {} # Keeps track of the previous tiles the search has seen alongside their coordinates.
-		coord_queue = [Coordinates(current_bot_position.x, current_bot_position.y)] # The coordinates that will be checked and expanded from.
-		previous_coords[self.tile_map[current_bot_position.y][current_bot_position.x]] = None # Since the search starts from where the robot is, None indicates that it is not expanded from any tile.
-		while coord_queue:
-			current_coords = coord_queue.pop(0) # Takes the coordinates from the front of the queue.
-			# If those coordinates are at a frontier tile, the loop is exited with the current coords still saved.
-			if isinstance(self.tile_map[current_coords.y][current_coords.x], Grass_Tile) and self.tile_map[current_coords.y][current_coords.x].frontier:
-				return self.get_directions(current_coords, previous_coords)
-			# The rest of the code in the loop adds neighboring tiles to the queue, and records them in previous_coords.
-			next_coords = Coordinates(current_coords.x, current_coords.y - 1)
-			if not isinstance(self.tile_map[next_coords.y][next_coords.x], Wall_Tile) and not isinstance(self.tile_map[next_coords.y][next_coords.x], Unknown_Tile) and self.tile_map[next_coords.y][next_coords.x] not in previous_coords.keys():
-				coord_queue.append(next_coords)
-				previous_coords[self.tile_map[next_coords.y][next_coords.x]] = current_coords
-			next_coords = Coordinates(current_coords.x + 1, current_coords.y)
-			if not isinstance(self.tile_map[next_coords.y][next_coords.x], Wall_Tile) and not isinstance(self.tile_map[next_coords.y][next_coords.x], Unknown_Tile) and self.tile_map[next_coords.y][next_coords.x] not in previous_coords.keys():
-				coord_queue.append(next_coords)
-				previous_coords[self.tile_map[next_coords.y][next_coords.x]] = current_coords
-			next_coords = Coordinates(current_coords.x, current_coords.y + 1)
-			if not isinstance(self.tile_map[next_coords.y][next_coords.x], Wall_Tile) and not isinstance(self.tile_map[next_coords.y][next_coords.x], Unknown_Tile) and self.tile_map[next_coords.y][next_coords.x] not in previous_coords.keys():
-				coord_queue.append(next_coords)
-				previous_coords[self.tile_map[next_coords.y][next_coords.x]] = current_coords
-			next_coords = Coordinates(current_coords.x - 1, current_coords.y)
-			if not isinstance(self.tile_map[next_coords.y][next_coords.x], Wall_Tile) and not isinstance(self.tile_map[next_coords.y][next_coords.x], Unknown_Tile) and self.tile_map[next_coords.y][next_coords.x] not in previous_coords.keys():
-				coord_queue.append(next_coords)
-				previous_coords[self.tile_map[next_coords.y][next_coords.x]] = current_coords
-
-		self.fully_explored = True
-		return None
+		self.add_frontier()
+		# Every known walkable tile can be reached, so the map is explored as soon as there are no frontiers left.
+		if not self.frontiers:
+			self.fully_explored = True
+			return None
+		start = self.index(current_bot_position.x, current_bot_position.y)
+		# Frontier queries are not cached. A field from the bot's position is useless once the bot moves, which it always has between queries, and a field from the frontiers cannot be repaired, as frontiers stop being frontiers as well as appearing.
+		# A fresh search that stops at the first frontier it reaches only expands the tiles closer than that frontier.
+		path = self.search.nearest(self.tiles, WALKABLE, self.stride, start, self.frontiers)
+		if path is None:
+			self.fully_explored = True
+			return None
+		return self.get_directions(path)
 		
-	# Finds the coordinates that lead from the start to end, then converts them to bot-readable directions.
-	def get_coord_path_from(self, start, end):
-		previous_coords = {} # Keeps track of the previous tiles the search has seen alongside their coordinates.
-		coord_queue = [Coordinates(start.x, start.y)] # The coordinates that will be checked and expanded from.
-		previous_coords[self.tile_map[start.y][start.x]] = None # Since the search starts from where the robot is, None indicates that it is not expanded from any tile.
-		while coord_queue:
-			current_coords = coord_queue.pop(0) # Takes the coordinates from the front of the queue.
-			# If the correct coordinates are found, the loop is exited with the current coords still saved.
-			if (current_coords.x == end.x) and (current_coords.y == end.y):
-				return self.get_directions(current_coords, previous_coords) + ["U"]
-			# The rest of the code in the loop adds neighboring tiles to the queue, and records them in previous_coords.
-			next_coords = Coordinates(current_coords.x, current_coords.y - 1)
-			if not isinstance(self.tile_map[next_coords.y][next_coords.x], Wall_Tile) and not isinstance(self.tile_map[next_coords.y][next_coords.x], Unknown_Tile) and self.tile_map[next_coords.y][next_coords.x] not in previous_coords.keys():
-				coord_queue.append(next_coords)
-				previous_coords[self.tile_map[next_coords.y][next_coords.x]] = current_coords
-			next_coords = Coordinates(current_coords.x + 1, current_coords.y)
-			if not isinstance(self.tile_map[next_coords.y][next_coords.x], Wall_Tile) and not isinstance(self.tile_map[next_coords.y][next_coords.x], Unknown_Tile) and self.tile_map[next_coords.y][next_coords.x] not in previous_coords.keys():
-				coord_queue.append(next_coords)
-				previous_coords[self.tile_map[next_coords.y][next_coords.x]] = current_coords
-			next_coords = Coordinates(current_coords.x, current_coords.y + 1)
-			if not isinstance(self.tile_map[next_coords.y][next_coords.x], Wall_Tile) and not isinstance(self.tile_map[next_coords.y][next_coords.x], Unknown_Tile) and self.tile_map[next_coords.y][next_coords.x] not in previous_coords.keys():
-				coord_queue.append(next_coords)
-				previous_coords[self.tile_map[next_coords.y][next_coords.x]] = current_coords
-			next_coords = Coordinates(current_coords.x - 1, current_coords.y)
-			if not isinstance(self.tile_map[next_coords.y][next_coords.x], Wall_Tile) and not isinstance(self.tile_map[next_coords.y][next_coords.x], Unknown_Tile) and self.tile_map[next_coords.y][next_coords.x] not in previous_coords.keys():
-				coord_queue.append(next_coords)
-				previous_coords[self.tile_map[next_coords.y][next_coords.x]] = current_coords
-
-	# Converts a list of coordinates to usable bot directions.
-	def get_directions(self, end, connections):
-		coord_path = []
-		# Uses previous_coords to trace the path from the frontier backwards to the robot.
-		while end:
-			coord_path.append(end)
-			end = connections[self.tile_map[end.y][end.x]]
-
-		coord_path = coord_path[::-1] # reverses coord_path because it's backwards.
-		directions = []
-		# iterates through coord_path 2 elements at a time, and creates directions using their differences.
-		for coord1, coord2 in zip(coord_path, coord_path[1:]):
-			if coord1.y == coord2.y + 1:
-				directions.append("N")
-			elif coord1.x == coord2.x - 1:
-				directions.append("E")
-			elif coord1.y == coord2.y - 1:
-				directions.append("S")
-			else:
-				directions.append("W")
-		return directions
+	# Returns the distance field from a tile, building it if it is not cached.
+	def distance_field(self, source: int):
+		if source in self.fields:
+			self.fields.move_to_end(source)
+			return self.fields[source]
+		field = search.DistanceField(self.tiles, WALKABLE, self.stride, source)
+		self.fields[source] = field
+		if len(self.fields) > MAX_DISTANCE_FIELDS:
+			self.fields.popitem(last=False)
+		return field
+
+	# Finds the tiles that lead from the start to end, then converts them to bot-readable directions.
+	# By default the path is read from the cached distance field of the end, which is usually a portal or the exit and is asked for over and over.
+	# method can also be "astar", "jps" or "bfs" to search from scratch. Jump Point Search ("jps") expands the fewest tiles in large open areas.
+	def get_coord_path_from(self, start, end, method="field"):
+		start_index = self.index(start.x, start.y)
+		end_index = self.index(end.x, end.y)
+		if method == "field":
+			path = self.distance_field(end_index).path_to_source(start_index)
+		elif method == "bfs":
+			path = self.search.bfs(self.tiles, WALKABLE, self.stride, start_index, end_index)
+		elif method == "jps":
+			path = self.search.jump_path(self.tiles, WALKABLE, self.stride, start_index, end_index)
+		else:
+			path = self.search.shortest_path(self.tiles, WALKABLE, self.stride, start_index, end_index)
+		if path is None:
+			return None
+		return self.get_directions(path) + ["U"]
+
+	# Converts a path of tile indices to usable bot directions.
+	def get_directions(self, path):
+		return search.directions(path, self.stride)
 
 # Extended Coordinates class that includes the map the object is located in.	
 class WorldCoordinates(Coordinates):
@@ -291,22 +243,26 @@ class WorldCoordinates(Coordinates):
 	def __str__(self):
 		return f"(w:{self.world}, x:{self.x}, y:{self.y})"
 
-# Global variables
-unique_tile_locations = {"b": None, "o": None, "p": None, "y": None} # Where each of the portals is.
-portal_uses = {"b": 0, "o": 0, "p": 0, "y": 0} # How many times each portal has been used.
 portal_opposite = {"b": "o", "o": "b", "p": "y", "y": "p"} # A dict to convert a portal to its opposite.
-bot_coordinates = [] # Keeps track of where each bot is.
-exit_location = None # Keeps track of where the exit is.
 
 # A class built on top of the map class. Manages multiple maps.
+# Everything a simulation learns lives on its own manager, so any number of simulations can run side by side.
+# With coordinate_frontiers set, bots that share a map split its frontiers between them instead of each heading for its own nearest one.
 class NavigationManager(object):
-	def __init__(self):
-		self.NUM_BOTS = 2 # How many bots are in use.
+	def __init__(self, coordinate_frontiers=False, num_bots=2):
+		self.NUM_BOTS = num_bots # How many bots are in use. They take their turns in order.
+		self.unique_tile_locations = {"b": None, "o": None, "p": None, "y": None} # Where each of the portals is.
+		self.bot_coordinates = [] # Keeps track of where each bot is.
+		self.exit_location = None # Keeps track of where the exit is.
 		self.bot_paths = [] # The current paths each bot is taking.
+		self.bot_targets = [] # The frontier each bot's path leads to when frontiers are coordinated, or None.
 		# Fills each list with the number of coordinates and paths needed.
 		for i in range(self.NUM_BOTS):
-			bot_coordinates.append(WorldCoordinates(0, 0, 0))
+			self.bot_coordinates.append(WorldCoordinates(0, 0, 0))
 			self.bot_paths.append([])
+			self.bot_targets.append(None)
+		self.exited_bots = set() # The bots that have left through the exit.
+		self.coordinate_frontiers = coordinate_frontiers
 		self.current_bot = 0 # The bot that is being used. Corresponds with its indices.
 		self.maps = [Map()] # Initializes a single map.
 		self.single = False # True if there is only one bot left.
@@ -314,17 +270,16 @@ class NavigationManager(object):
 		
 	# Maps out the area around the bot.
 	def scan(self, percepts):
-		current_bot_coordinates = bot_coordinates[self.current_bot]
+		current_bot_coordinates = self.bot_coordinates[self.current_bot]
 		current_bot_world = current_bot_coordinates.world
 		current_map = self.maps[current_bot_world]
 		current_map.scan(percepts, current_bot_coordinates)
-		global exit_location
 		# Each direction is checked for important tiles. If it's something that should be used immediately, it pathfinds to it.
 		for index, i in enumerate(percepts["N"]):
 			if i in "obyp":
-				unique_tile_locations[i] = WorldCoordinates(current_bot_world, current_bot_coordinates.x, current_bot_coordinates.y - (index + 1))
+				self.unique_tile_locations[i] = WorldCoordinates(current_bot_world, current_bot_coordinates.x, current_bot_coordinates.y - (index + 1))
 			if (i == "r") and not self.exited:
-				exit_location = WorldCoordinates(current_bot_world, current_bot_coordinates.x, current_bot_coordinates.y - (index + 1))
+				self.exit_location = WorldCoordinates(current_bot_world, current_bot_coordinates.x, current_bot_coordinates.y - (index + 1))
 				self.exited = True
 				self.bot_paths[self.current_bot] = (["N"] * (index + 1)) + ["U"]
 				return
@@ -335,9 +290,9 @@ class NavigationManager(object):
 
 		for index, i in enumerate(percepts["E"]):
 			if i in "obyp":
-				unique_tile_locations[i] = WorldCoordinates(current_bot_world, current_bot_coordinates.x + (index + 1), current_bot_coordinates.y)
+				self.unique_tile_locations[i] = WorldCoordinates(current_bot_world, current_bot_coordinates.x + (index + 1), current_bot_coordinates.y)
 			if (i == "r") and not self.exited:
-				exit_location = WorldCoordinates(current_bot_world, current_bot_coordinates.x + (index + 1), current_bot_coordinates.y)
+				self.exit_location = WorldCoordinates(current_bot_world, current_bot_coordinates.x + (index + 1), current_bot_coordinates.y)
 				self.exited = True
 				self.bot_paths[self.current_bot] = (["E"] * (index + 1)) + ["U"]
 				return
@@ -347,9 +302,9 @@ class NavigationManager(object):
 			
 		for index, i in enumerate(percepts["S"]):
 			if i in "obyp":
-				unique_tile_locations[i] = WorldCoordinates(current_bot_world, current_bot_coordinates.x, current_bot_coordinates.y + (index + 1))
+				self.unique_tile_locations[i] = WorldCoordinates(current_bot_world, current_bot_coordinates.x, current_bot_coordinates.y + (index + 1))
 			if (i == "r") and not self.exited:
-				exit_location = WorldCoordinates(current_bot_world, current_bot_coordinates.x, current_bot_coordinates.y + (index + 1))
+				self.exit_location = WorldCoordinates(current_bot_world, current_bot_coordinates.x, current_bot_coordinates.y + (index + 1))
 				self.exited = True
 				self.bot_paths[self.current_bot] = (["S"] * (index + 1)) + ["U"]
 				return
@@ -359,9 +314,9 @@ class NavigationManager(object):
 
 		for index, i in enumerate(percepts["W"]):
 			if i in "obyp":
-				unique_tile_locations[i] = WorldCoordinates(current_bot_world, current_bot_coordinates.x - (index + 1), current_bot_coordinates.y)
+				self.unique_tile_locations[i] = WorldCoordinates(current_bot_world, current_bot_coordinates.x - (index + 1), current_bot_coordinates.y)
 			if (i == "r") and not self.exited:
-				exit_location = WorldCoordinates(current_bot_world, current_bot_coordinates.x - (index + 1), current_bot_coordinates.y)
+				self.exit_location = WorldCoordinates(current_bot_world, current_bot_coordinates.x - (index + 1), current_bot_coordinates.y)
 				self.exited = True
 				self.bot_paths[self.current_bot] = (["W"] * (index + 1)) + ["U"]
 				return
@@ -371,36 +326,152 @@ class NavigationManager(object):
 
 	# Tells the bot where to go in order to find new tiles.
 	def discover(self):
-		current_bot_coordinates = bot_coordinates[self.current_bot]
+		timing.current().count("nav.discover_calls")
+		current_bot_coordinates = self.bot_coordinates[self.current_bot]
 		current_bot_world = current_bot_coordinates.world
 		current_map = self.maps[current_bot_world]
 		# Attempts to find a frontier in the current map.
-		path = current_map.discover(current_bot_coordinates)
+		if self.coordinate_frontiers:
+			path = self.assign_frontiers()
+		else:
+			path = current_map.discover(current_bot_coordinates)
 		if path:
 			return path
-		# If the AI was unable to find a frontier in the current map, it decides upon a portal to use.
-		viable_portals = {k:v for k,v in unique_tile_locations.items() if ((v) and (v.world == current_bot_world))}
-		# First, it tries to enter a portal that leads to a new map, but only if all of the current maps are fully explored.
-		if all(x.fully_explored for x in self.maps):
-			for k in viable_portals:
-				if not unique_tile_locations[portal_opposite[k]]:
-					self.maps.append(Map())
-					unique_tile_locations[portal_opposite[k]] = WorldCoordinates(len(self.maps) - 1, 0, 0)
-					return current_map.get_coord_path_from(current_bot_coordinates, viable_portals[k])
-		# If it will not use a portal to a new map, it will instead go to the least used portal in its world.
-		least_used = min(viable_portals, key=portal_uses.get)
-		return current_map.get_coord_path_from(current_bot_coordinates, viable_portals[least_used])
-		
+		# If the AI was unable to find a frontier in the current map, it takes the shortest route through the known portals to a map that still has frontiers.
+		nodes, distances, previous = self.plan_routes()
+		unexplored = [name for name in distances if name != "bot" and not self.maps[nodes[name].world].fully_explored and nodes[name].world != current_bot_world]
+		if unexplored:
+			return self.route(nodes, previous, min(unexplored, key=distances.get))
+		# Only when no known map with frontiers can be reached does it enter a portal that leads to a new map.
+		new_portals = [name for name in distances if name in portal_opposite and not self.unique_tile_locations[portal_opposite[name]]]
+		if new_portals:
+			nearest = min(new_portals, key=distances.get)
+			self.maps.append(Map())
+			self.unique_tile_locations[portal_opposite[nearest]] = WorldCoordinates(len(self.maps) - 1, 0, 0)
+			return self.route(nodes, previous, nearest) + ["U"]
+		# There is nothing left to explore, so the bot waits where it is.
+		return []
+
+	# Dijkstra over the graph of known portals and the exit, starting from the current bot.
+	# Nodes in the same map are joined by their walking distance, read from the map's cached distance fields, and each portal is joined to its opposite by the one turn it takes to use it.
+	# targets adds more named locations to the graph, such as a goal to route to.
+	# Returns the location of every node, and the distance to and previous step of every node that can be reached. The current bot is the node "bot".
+	def plan_routes(self, targets=None):
+		timing.current().count("nav.route_plans")
+		nodes = {name: location for name, location in self.unique_tile_locations.items() if location}
+		if self.exit_location:
+			nodes["r"] = self.exit_location
+		if targets:
+			nodes.update(targets)
+		nodes["bot"] = self.bot_coordinates[self.current_bot]
+		distances = {"bot": 0}
+		previous = {"bot": None}
+		heap = [(0, "bot")]
+		while heap:
+			distance, name = heapq.heappop(heap)
+			if distance > distances[name]:
+				continue
+			location = nodes[name]
+			current_map = self.maps[location.world]
+			edges = []
+			for other, other_location in nodes.items():
+				if other != name and other != "bot" and other_location.world == location.world:
+					# The field is built from the other node, as portals and the exit are what fields are cached for.
+					field = current_map.distance_field(current_map.index(other_location.x, other_location.y))
+					walk = field.distance(current_map.index(location.x, location.y))
+					if walk != -1:
+						edges.append((other, walk, "walk"))
+			if name in portal_opposite and portal_opposite[name] in nodes:
+				edges.append((portal_opposite[name], 1, "use"))
+			for other, weight, how in edges:
+				if other not in distances or distance + weight < distances[other]:
+					distances[other] = distance + weight
+					previous[other] = (name, how)
+					heapq.heappush(heap, (distance + weight, other))
+		return nodes, distances, previous
+
+	# Converts the steps that plan_routes took to reach a node into bot directions, ending on the node.
+	def route(self, nodes, previous, name):
+		steps = []
+		while previous[name]:
+			steps.append((previous[name][0], name, previous[name][1]))
+			name = previous[name][0]
+		directions = []
+		for start, end, how in reversed(steps):
+			if how == "use":
+				directions.append("U")
+			else:
+				current_map = self.maps[nodes[start].world]
+				directions += current_map.get_coord_path_from(nodes[start], nodes[end])[:-1]
+		return directions
+
+	# Returns directions from the current bot to a location in any map, using it at the end, or None if no known route leads there.
+	def route_to(self, location):
+		nodes, distances, previous = self.plan_routes({"target": location})
+		if "target" not in distances:
+			return None
+		return self.route(nodes, previous, "target") + ["U"]
+
+	# Splits the frontiers of the current bot's map between the bots in that map, and returns the current bot's path.
+	# A single search from every bot at once claims each tile for the bot closest to it.
+	# Then, closest pairs first, each bot without a path is given the nearest frontier it claimed that no other bot is heading for.
+	# The frontiers given to the other bots are reserved by setting their paths.
+	def assign_frontiers(self):
+		current_bot_coordinates = self.bot_coordinates[self.current_bot]
+		current_bot_world = current_bot_coordinates.world
+		current_map = self.maps[current_bot_world]
+		current_map.add_frontier()
+		if not current_map.frontiers:
+			current_map.fully_explored = True
+			return None
+		bots = [i for i in range(self.NUM_BOTS) if i not in self.exited_bots and self.bot_coordinates[i].world == current_bot_world]
+		needing = {i for i in bots if i == self.current_bot or not self.bot_paths[i]}
+		# Frontiers that other bots are already heading for are left to them.
+		reserved = set()
+		for i in bots:
+			if i not in needing and self.bot_targets[i]:
+				reserved.add(current_map.index(self.bot_targets[i].x, self.bot_targets[i].y))
+
+		sources = [current_map.index(self.bot_coordinates[i].x, self.bot_coordinates[i].y) for i in bots]
+		claims = current_map.search
+		assigned = {}
+		# Tiles are reached in order of distance from their bot, so the first frontier a bot reaches is its nearest.
+		for index in claims.claim(current_map.tiles, WALKABLE, current_map.stride, sources):
+			bot = bots[claims.owner(index)]
+			if bot in needing and bot not in assigned and index in current_map.frontiers and index not in reserved:
+				assigned[bot] = claims.path(index)
+				reserved.add(index)
+				if len(assigned) == len(needing):
+					break
+		# A bot that is closest to none of the free frontiers still heads for its nearest free one, or failing that, its nearest one.
+		for i in needing:
+			if i not in assigned:
+				start = sources[bots.index(i)]
+				free = current_map.frontiers - reserved
+				path = current_map.search.nearest(current_map.tiles, WALKABLE, current_map.stride, start, free or current_map.frontiers)
+				if path is not None:
+					assigned[i] = path
+					reserved.add(path[-1])
+
+		for i, path in assigned.items():
+			target = current_map.coordinates(path[-1])
+			self.bot_targets[i] = WorldCoordinates(current_bot_world, target.x, target.y)
+			if i != self.current_bot:
+				self.bot_paths[i] = current_map.get_directions(path)
+		if self.current_bot not in assigned:
+			return None
+		return current_map.get_directions(assigned[self.current_bot])
+
 	# Adds frontiers to the current map.
 	def add_frontier(self):
-		current_bot_coordinates = bot_coordinates[self.current_bot]
+		current_bot_coordinates = self.bot_coordinates[self.current_bot]
 		current_bot_world = current_bot_coordinates.world
 		current_map = self.maps[current_bot_world]
 		current_map.add_frontier()
 
 	# Prints the current map.
 	def print_map(self):
-		current_bot_coordinates = bot_coordinates[self.current_bot]
+		current_bot_coordinates = self.bot_coordinates[self.current_bot]
 		current_bot_world = current_bot_coordinates.world
 		current_map = self.maps[current_bot_world]
 		current_map.print_map()
@@ -409,43 +480,60 @@ class NavigationManager(object):
 	def next_direction(self, below):
 		if not self.bot_paths[self.current_bot]:
 			self.bot_paths[self.current_bot] = self.discover()
+			if not self.bot_paths[self.current_bot]:
+				return self.wait(below)
 			return self.next_direction(below)
 		d = self.bot_paths[self.current_bot].pop(0)
 		if d == "N":
-			bot_coordinates[self.current_bot].y -= 1
+			self.bot_coordinates[self.current_bot].y -= 1
 		elif d == "E":
-			bot_coordinates[self.current_bot].x += 1
+			self.bot_coordinates[self.current_bot].x += 1
 		elif d == "S":
-			bot_coordinates[self.current_bot].y += 1
+			self.bot_coordinates[self.current_bot].y += 1
 		elif d == "W":
-			bot_coordinates[self.current_bot].x -= 1
+			self.bot_coordinates[self.current_bot].x -= 1
 		# For cases where the next step is "U", the bot makes necessary adjustments to the game state.
 		elif d == "U":
 			if below == "r":
-				self.single = True
-				self.swap_bot()
+				self.exited_bots.add(self.current_bot)
+				self.single = len(self.exited_bots) >= self.NUM_BOTS - 1
 			elif below in "bopy":
-				bot_coordinates[self.current_bot].x = unique_tile_locations[portal_opposite[below]].x
-				bot_coordinates[self.current_bot].y = unique_tile_locations[portal_opposite[below]].y
-				bot_coordinates[self.current_bot].world = unique_tile_locations[portal_opposite[below]].world
-				portal_uses[below] += 1
+				self.bot_coordinates[self.current_bot].x = self.unique_tile_locations[portal_opposite[below]].x
+				self.bot_coordinates[self.current_bot].y = self.unique_tile_locations[portal_opposite[below]].y
+				self.bot_coordinates[self.current_bot].world = self.unique_tile_locations[portal_opposite[below]].world
 		return d
 	
-	# Swaps the bot's turn, so that the proper index is used.
+	# Keeps the bot where it is for a turn without using the tile below it, which could be a portal or the exit.
+	# "U" does nothing on grass. Anywhere else the bot walks into a neighbouring wall, or if there is none, steps off onto a walkable neighbour.
+	def wait(self, below):
+		if below == "g":
+			return "U"
+		current_bot_coordinates = self.bot_coordinates[self.current_bot]
+		current_map = self.maps[current_bot_coordinates.world]
+		index = current_map.index(current_bot_coordinates.x, current_bot_coordinates.y)
+		neighbours = (("N", -current_map.stride), ("E", 1), ("S", current_map.stride), ("W", -1))
+		for d, step in neighbours:
+			if current_map.tiles[index + step] == WALL:
+				return d
+		for d, step in neighbours:
+			if WALKABLE[current_map.tiles[index + step]]:
+				self.bot_paths[self.current_bot] = [d]
+				return self.next_direction(below)
+		return "U"
+
+	# Swaps the bot's turn, so that the proper index is used. Bots that have exited are skipped, so once only one bot is left it keeps the turn.
+	# Called by the AIs exactly once at the end of every turn, including the turn a bot exits on.
 	def swap_bot(self):
-		self.current_bot = (self.current_bot + 1) % self.NUM_BOTS
-		for i in bot_coordinates:
-			print(i)
-		print(self.bot_paths)
+		for i in range(self.NUM_BOTS):
+			self.current_bot = (self.current_bot + 1) % self.NUM_BOTS
+			if self.current_bot not in self.exited_bots:
+				break
 
-	# Navigates the bot to the exit when the bot is in the exit's map.
+	# Navigates the bot to the exit from whichever map it is in, once another bot has exited or every known map is explored.
 	def exit_check(self):
-		if not self.single:
+		if not self.exited_bots and not all(m.fully_explored for m in self.maps):
 			return
 		if self.bot_paths[self.current_bot]:
 			return
-		current_bot_coordinates = bot_coordinates[self.current_bot]
-		current_bot_world = current_bot_coordinates.world
-		current_map = self.maps[current_bot_world]
-		if exit_location and (exit_location.world == current_bot_world):
-			self.bot_paths[self.current_bot] = current_map.get_coord_path_from(current_bot_coordinates, exit_location)
\ No newline at end of file
+		if self.exit_location:
+			self.bot_paths[self.current_bot] = self.route_to(self.exit_location)
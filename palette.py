@@ -0,0 +1,35 @@
+# Colours the world is drawn in, shared by the pygame display and the
+# headless frame export.
+
+CELL_COLORS = {
+    'w':'#000000',
+    'b':'#0b63d6',
+    'o':'#fc9d03',
+    'r':'#ab3307',
+    'g':'#59eb05',
+    'p':'#c708c4',
+    'y':'#ffff03',
+    '0':'#59eb05',
+    '1':'#59eb05',
+    '2':'#59eb05',
+    '3':'#59eb05',
+    '4':'#59eb05',
+    '5':'#59eb05',
+    '6':'#59eb05',
+    '7':'#59eb05',
+    '8':'#59eb05',
+    '9':'#59eb05',
+}
+BACKGROUND_COLOR = '#000000'
+AGENT_COLOR = '#FFFFFF'
+TEXT_COLOR = '#000000'
+
+# Cells whose character is drawn over them.
+TEXT_CELLS = [
+    '0', '1', '2', '3', '4',
+    '5', '6', '7', '8', '9'
+]
+
+
+def rgb(color):
+    return bytes.fromhex(color.lstrip('#'))
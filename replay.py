@@ -0,0 +1,219 @@
+# Compact recordings of simulation runs, and a replayer for them.
+#
+# The world only changes in response to the agents' commands, so a run
+# can be rebuilt from the world it started in and the commands alone:
+#
+#   header    magic, format version, world hash, max turns, turns played,
+#             agent count, event count
+#   counts    command count for each agent
+#   commands  one byte per command, for each agent in turn order
+#   events    turn, agent, kind and two arguments for each trigger
+#
+# The events are not needed to replay a run. They make it possible to find
+# where a long run teleported or scored without replaying it, and let the
+# replayer check that the replay did the same as the recording.
+#
+# Replaying runs the sim with agents that play back the recorded commands,
+# so the log, score and display come out as they did in the original run,
+# without any of the cost of the AIs.
+
+import argparse
+import frames
+import hashlib
+import struct
+import sim
+import world
+import worldfile
+
+MAGIC = b'MWR\x00'
+FORMAT_VERSION = 2
+EXTENSION = ".mwr"
+
+HEADER = struct.Struct('<4sH32siIBI')
+COUNT = struct.Struct('<I')
+EVENT = struct.Struct('<IBBii')
+
+EVENT_KINDS = ["EXIT", "TELEPORT", "GOAL_TRIGGERED"]
+
+# Recorded in place of commands that are not a single character.
+INVALID_COMMAND = b'?'
+
+
+class ReplayMismatchException(Exception):
+    pass
+
+
+# Identifies the state a world starts in: its size, cells and agent starts.
+def world_hash(the_world):
+    digest = hashlib.sha256()
+    digest.update(struct.pack('<II', the_world.width, the_world.height))
+    digest.update(the_world.grid.cells)
+    for x, y, facing in worldfile.agent_starts(the_world):
+        digest.update(struct.pack('<iic', x, y, facing.encode('ascii')))
+    return digest.digest()
+
+
+def encode_event(turn, agent, trigger):
+    match trigger[0]:
+        case "EXIT":
+            args = (0, 0)
+        case "TELEPORT":
+            args = (trigger[1], trigger[2])
+        case "GOAL_TRIGGERED":
+            args = (ord(trigger[2]), 0)
+    return (turn, world.World.AGENT_NAMES.index(agent), EVENT_KINDS.index(trigger[0]), *args)
+
+
+class Recorder:
+
+    # Must be created before the run starts, while the world is still in
+    # its starting state.
+    def __init__(self, the_world, max_turns):
+        self.world_hash = world_hash(the_world)
+        self.max_turns = max_turns
+        self.turns = 0
+        names = world.World.AGENT_NAMES[:len(the_world.get_starts())]
+        self.commands = {agent: bytearray() for agent in names}
+        self.events = []
+
+    def command(self, agent, cmd):
+        if isinstance(cmd, str) and len(cmd) == 1 and cmd.isascii():
+            self.commands[agent] += cmd.encode('ascii')
+        else:
+            self.commands[agent] += INVALID_COMMAND
+
+    # trigger is what World.check_triggers returned.
+    def trigger(self, turn, agent, trigger):
+        if trigger[0] != "NONE":
+            self.events.append(encode_event(turn, agent, trigger))
+
+    def write(self, filename):
+        with worldfile.atomic_write(filename, suffix=EXTENSION) as f:
+            f.write(HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                self.world_hash,
+                -1 if self.max_turns is None else self.max_turns,
+                self.turns,
+                len(self.commands),
+                len(self.events)
+            ))
+            for commands in self.commands.values():
+                f.write(COUNT.pack(len(commands)))
+            for commands in self.commands.values():
+                f.write(commands)
+            for event in self.events:
+                f.write(EVENT.pack(*event))
+
+
+class Recording:
+
+    def __init__(self, world_hash, max_turns, turns, commands, events):
+        self.world_hash = world_hash
+        self.max_turns = max_turns
+        self.turns = turns
+        self.commands = commands
+        self.events = events
+
+
+def load(filename):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{filename} is not a replay.")
+    magic, version, recorded_hash, max_turns, turns, num_agents, num_events = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{filename} is not a replay.")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{filename} is replay version {version}, expected {FORMAT_VERSION}.")
+    offset = HEADER.size
+    if len(data) < offset + num_agents * COUNT.size:
+        raise ValueError(f"{filename} is truncated.")
+    counts = [count for count, in COUNT.iter_unpack(data[offset:offset + num_agents * COUNT.size])]
+    offset += num_agents * COUNT.size
+    if len(data) != offset + sum(counts) + num_events * EVENT.size:
+        raise ValueError(f"{filename} is truncated.")
+
+    commands = {}
+    for agent, count in zip(world.World.AGENT_NAMES, counts):
+        commands[agent] = data[offset:offset + count]
+        offset += count
+    events = list(EVENT.iter_unpack(data[offset:]))
+    return Recording(recorded_hash, None if max_turns == -1 else max_turns, turns, commands, events)
+
+
+# Stands in for an AI, returning the recorded commands in order.
+class ReplayAgent:
+
+    def __init__(self, commands):
+        self.commands = commands.decode('ascii')
+        self.turn = 0
+
+    def update(self, percepts, msg):
+        cmd = self.commands[self.turn]
+        self.turn += 1
+        return cmd, None
+
+
+def agent_factory(commands):
+    return lambda max_turns: ReplayAgent(commands)
+
+
+# Replays a recording on the world it was recorded in, and returns what
+# run_sim returns. Raises ReplayMismatchException if the world is not the
+# one that was recorded, or if the replay triggers different events.
+def replay(the_world, recording, log=None, use_display=False, display_speed=0.5, exporter=None):
+    if world_hash(the_world) != recording.world_hash:
+        raise ReplayMismatchException("The replay was recorded in a different world.")
+    recorder = Recorder(the_world, recording.max_turns)
+    result = sim.run_sim(
+        the_world,
+        recording.max_turns,
+        log,
+        use_display,
+        display_speed,
+        ai_factories=[agent_factory(commands) for commands in recording.commands.values()],
+        recorder=recorder,
+        pace_display=True,
+        frames=exporter
+    )
+    if recorder.events != recording.events or recorder.turns != recording.turns:
+        raise ReplayMismatchException("The replay did not play out as recorded.")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded simulation without running the AIs.")
+    parser.add_argument("replay", help="replay file recorded with main.py -r")
+    parser.add_argument("-w", "--world", required=True, help="the world the replay was recorded in")
+    parser.add_argument("-l", "--log", default=None, help="write the log to a file instead of stdout")
+    parser.add_argument(
+        "-d", "--display", type=float, default=None, metavar="SPEED",
+        help="show the replay, pausing SPEED seconds each turn"
+    )
+    parser.add_argument(
+        "-x", "--export", default=None, metavar="OUT",
+        help="draw the replay to an animated PNG (OUT ending in .png or .apng) or a directory of PNGs"
+    )
+    parser.add_argument(
+        "-n", "--every", type=frames.positive_int, default=1, metavar="N",
+        help="with --export, only draw every Nth turn"
+    )
+    args = parser.parse_args(argv)
+
+    recording = load(args.replay)
+    the_world = worldfile.load(args.world, use_cache=False)
+    use_display = args.display is not None
+    display_speed = args.display if use_display else 0.5
+    exporter = None
+    if args.export is not None:
+        exporter = frames.FrameExporter(the_world, args.export, args.every)
+    if args.log is None:
+        replay(the_world, recording, None, use_display, display_speed, exporter)
+    else:
+        with open(args.log, 'w') as log:
+            replay(the_world, recording, log, use_display, display_speed, exporter)
+
+
+if __name__ == "__main__":
+    main()
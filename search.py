@@ -0,0 +1,388 @@
+from array import array
+from collections import deque
+import heapq
+
+# Searches over a flat, row-major grid of tile kinds, such as navigation.Map.tiles.
+# Tiles are addressed by their index, and a tile's neighbours are the tiles {stride} away vertically and 1 away horizontally.
+# The grid is expected to have a border of unwalkable tiles, so neighbouring indices of walkable tiles are always in range.
+
+NO_PARENT = -1
+
+# How many tiles a jump in Jump Point Search checks one at a time before scanning the rest of the row in bulk.
+SHORT_JUMP = 2
+
+# Neighbour offsets in the order North, East, South, West. Searches expand neighbours in this order.
+def neighbour_steps(stride: int):
+	return (-stride, 1, stride, -1)
+
+# Converts a path of tile indices to bot-readable directions.
+def directions(path, stride: int):
+	steps = {-stride: "N", 1: "E", stride: "S", -1: "W"}
+	# iterates through the path 2 elements at a time, and creates directions using their differences.
+	return [steps[index2 - index1] for index1, index2 in zip(path, path[1:])]
+
+# Runs searches over one grid. Keeps its bookkeeping arrays between searches so that a search does not allocate memory for every tile.
+# Each search uses a new generation number, and a tile only counts as seen if its mark matches the current generation.
+class GridSearch(object):
+	def __init__(self):
+		self.parents = array("q") # The tile each seen tile was reached from.
+		self.costs = array("q") # The distance from the start to each seen tile, used by A*.
+		self.marks = array("L") # The generation in which each tile was last seen.
+		self.owners = array("q") # The source that claimed each tile, used by claim().
+		self.generation: int = 0
+		self.expanded: int = 0 # How many tiles the last search expanded.
+
+	# Prepares the bookkeeping arrays for a search over {size} tiles.
+	def begin(self, size: int):
+		if len(self.marks) < size:
+			extra = size - len(self.marks)
+			self.parents.extend(array("q", [NO_PARENT]) * extra)
+			self.costs.extend(array("q", [0]) * extra)
+			self.marks.extend(array("L", [0]) * extra)
+		self.generation += 1
+		if self.generation >= 2**32:
+			self.marks = array("L", [0]) * len(self.marks)
+			self.generation = 1
+		self.expanded = 0
+
+	# Marks a tile as seen, reached from {parent}.
+	def visit(self, index: int, parent: int):
+		self.marks[index] = self.generation
+		self.parents[index] = parent
+
+	def seen(self, index: int):
+		return self.marks[index] == self.generation
+
+	# Follows the parents back from {end}, and returns the path from the start to {end}.
+	def trace(self, end: int):
+		path = []
+		while end != NO_PARENT:
+			path.append(end)
+			end = self.parents[end]
+		path.reverse()
+		return path
+
+	# Breadth first search from {start} to the nearest tile in {targets}.
+	# Returns the path as a list of tile indices, or None if no target can be reached.
+	# Ties between targets at the same distance are broken by the North, East, South, West expansion order.
+	def nearest(self, tiles, walkable, stride: int, start: int, targets):
+		self.begin(len(tiles))
+		steps = neighbour_steps(stride)
+		marks = self.marks
+		generation = self.generation
+		self.visit(start, NO_PARENT)
+		queue = deque((start,))
+		while queue:
+			current = queue.popleft()
+			self.expanded += 1
+			if current in targets:
+				return self.trace(current)
+			for step in steps:
+				next_index = current + step
+				if marks[next_index] != generation and walkable[tiles[next_index]]:
+					marks[next_index] = generation
+					self.parents[next_index] = current
+					queue.append(next_index)
+		return None
+
+	# Breadth first search from {start} to {end}. Returns the path as a list of tile indices, or None.
+	def bfs(self, tiles, walkable, stride: int, start: int, end: int):
+		return self.nearest(tiles, walkable, stride, start, (end,))
+
+	# Breadth first search from several sources at once, which claims every reachable tile for the source closest to it.
+	# Returns the reached tiles in the order they were reached. Afterwards, owner(), distance() and path() describe each reached tile.
+	def claim(self, tiles, walkable, stride: int, sources):
+		self.begin(len(tiles))
+		if len(self.owners) < len(self.marks):
+			self.owners.extend(array("q", [0]) * (len(self.marks) - len(self.owners)))
+		steps = neighbour_steps(stride)
+		marks = self.marks
+		costs = self.costs
+		owners = self.owners
+		generation = self.generation
+		queue = deque()
+		for number, source in enumerate(sources):
+			if marks[source] != generation:
+				self.visit(source, NO_PARENT)
+				costs[source] = 0
+				owners[source] = number
+				queue.append(source)
+		reached = []
+		while queue:
+			current = queue.popleft()
+			self.expanded += 1
+			reached.append(current)
+			cost = costs[current] + 1
+			for step in steps:
+				next_index = current + step
+				if marks[next_index] != generation and walkable[tiles[next_index]]:
+					marks[next_index] = generation
+					self.parents[next_index] = current
+					costs[next_index] = cost
+					owners[next_index] = owners[current]
+					queue.append(next_index)
+		return reached
+
+	# The position in {sources} of the source that claimed a tile in the last claim().
+	def owner(self, index: int):
+		return self.owners[index]
+
+	# The distance from a tile to its source in the last claim().
+	def distance(self, index: int):
+		return self.costs[index]
+
+	# The path from a tile's source to the tile in the last claim().
+	def path(self, index: int):
+		return self.trace(index)
+
+	# A* search from {start} to {end}, using the Manhattan distance as the heuristic.
+	# Returns a shortest path as a list of tile indices, or None if {end} cannot be reached.
+	def shortest_path(self, tiles, walkable, stride: int, start: int, end: int):
+		self.begin(len(tiles))
+		steps = neighbour_steps(stride)
+		marks = self.marks
+		costs = self.costs
+		generation = self.generation
+		end_x, end_y = end % stride, end // stride
+
+		def heuristic(index):
+			return abs(index % stride - end_x) + abs(index // stride - end_y)
+
+		self.visit(start, NO_PARENT)
+		costs[start] = 0
+		# Ties on the estimate go to the tile furthest from the start, which is the one most likely to be on the final path.
+		heap = [(heuristic(start), 0, start)]
+		while heap:
+			estimate, negative_cost, current = heapq.heappop(heap)
+			if -negative_cost > costs[current]:
+				continue # A shorter route to this tile was found after this entry was queued.
+			self.expanded += 1
+			if current == end:
+				return self.trace(current)
+			cost = costs[current] + 1
+			for step in steps:
+				next_index = current + step
+				if not walkable[tiles[next_index]]:
+					continue
+				if marks[next_index] != generation or cost < costs[next_index]:
+					marks[next_index] = generation
+					self.parents[next_index] = current
+					costs[next_index] = cost
+					heapq.heappush(heap, (cost + heuristic(next_index), -cost, next_index))
+		return None
+
+	# Jump Point Search from {start} to {end}, for 4-connected grids where every step costs the same.
+	# Works like shortest_path, but instead of queueing every neighbour it jumps in a straight line until it reaches a tile where the path may have to turn.
+	# In open areas only tiles next to the corners of obstacles, and tiles in line with them, are queued, so far fewer tiles are expanded.
+	# Returns a shortest path as a list of tile indices, or None if {end} cannot be reached.
+	# {walkable} must be a 256 byte table, like navigation.WALKABLE, as rows are translated with it.
+	def jump_path(self, tiles, walkable, stride: int, start: int, end: int):
+		self.begin(len(tiles))
+		marks = self.marks
+		costs = self.costs
+		parents = self.parents
+		generation = self.generation
+		end_x, end_y = end % stride, end // stride
+
+		def heuristic(index):
+			return abs(index % stride - end_x) + abs(index // stride - end_y)
+
+		# Follows a row from {index} in the direction of {step}, and returns the first jump point on it, or None if it runs into a wall.
+		# A tile is a jump point if it is the end, or if the tile above or below it is open while the one before that was blocked.
+		def jump_horizontal(index, step):
+			# Most jumps in corridors are short, so the first few tiles are checked one at a time.
+			for i in range(SHORT_JUMP):
+				index += step
+				if not walkable[tiles[index]]:
+					return None
+				if index == end:
+					return index
+				behind = index - step
+				if (walkable[tiles[index - stride]] and not walkable[tiles[behind - stride]]) or (walkable[tiles[index + stride]] and not walkable[tiles[behind + stride]]):
+					return index
+			# Past that, the rest of the row and the rows either side of it are turned into walkability bytes in one go, and searched for those patterns in C.
+			row_start = index - index % stride
+			length = row_start + stride - index if step == 1 else index - row_start + 1
+			def line(first):
+				stop = first + step * length
+				return tiles[first:stop if stop >= 0 else None:step].translate(walkable)
+			stop = line(index).find(0, 1)
+			if stop == -1:
+				stop = length
+			found = False
+			if row_start <= end < row_start + stride and 0 < (end - index) * step < stop:
+				stop = (end - index) * step
+				found = True
+			for side in (-stride, stride):
+				turn = line(index + side).find(b"\x00\x01", 0, stop) + 1
+				if turn > 0:
+					stop = turn
+					found = True
+			return index + stop * step if found else None
+
+		# Follows a column from {index} in the direction of {step}. On top of the checks in jump_horizontal, a tile is a jump point if a jump along its row finds one.
+		def jump_vertical(index, step):
+			while True:
+				index += step
+				if not walkable[tiles[index]]:
+					return None
+				if index == end:
+					return index
+				behind = index - step
+				if (walkable[tiles[index - 1]] and not walkable[tiles[behind - 1]]) or (walkable[tiles[index + 1]] and not walkable[tiles[behind + 1]]):
+					return index
+				if jump_horizontal(index, 1) is not None or jump_horizontal(index, -1) is not None:
+					return index
+
+		# The directions worth jumping in from a tile. From the start that is every direction, otherwise straight on and both turns, but never back.
+		def steps_from(index):
+			parent = parents[index]
+			if parent == NO_PARENT:
+				return neighbour_steps(stride)
+			if index // stride == parent // stride:
+				return (-stride, 1 if index > parent else -1, stride)
+			return (stride if index > parent else -stride, 1, -1)
+
+		self.visit(start, NO_PARENT)
+		costs[start] = 0
+		heap = [(heuristic(start), 0, start)]
+		while heap:
+			estimate, negative_cost, current = heapq.heappop(heap)
+			if -negative_cost > costs[current]:
+				continue
+			self.expanded += 1
+			if current == end:
+				return self.trace_jumps(current, stride)
+			for step in steps_from(current):
+				if step == 1 or step == -1:
+					jump_point = jump_horizontal(current, step)
+				else:
+					jump_point = jump_vertical(current, step)
+				if jump_point is None:
+					continue
+				cost = costs[current] + abs(jump_point - current) // abs(step)
+				if marks[jump_point] != generation or cost < costs[jump_point]:
+					marks[jump_point] = generation
+					parents[jump_point] = current
+					costs[jump_point] = cost
+					heapq.heappush(heap, (cost + heuristic(jump_point), -cost, jump_point))
+		return None
+
+	# Like trace, but for a search whose parents are jump points. Fills in the straight line of tiles between each jump point and its parent.
+	def trace_jumps(self, end: int, stride: int):
+		path = [end]
+		while self.parents[end] != NO_PARENT:
+			parent = self.parents[end]
+			if end // stride == parent // stride:
+				step = 1 if parent > end else -1
+			else:
+				step = stride if parent > end else -stride
+			path.extend(range(end + step, parent + step, step))
+			end = parent
+		path.reverse()
+		return path
+
+# Breadth first distances from one source tile to every walkable tile it can reach, with the tree of parents back to the source.
+# When more tiles become walkable, the field is repaired in place instead of being searched again.
+# Tiles only ever become walkable, never stop being walkable, so distances can only shrink and a repair gives the same distances as a fresh search.
+class DistanceField(object):
+	def __init__(self, tiles, walkable, stride: int, source: int):
+		self.tiles = tiles
+		self.walkable = walkable
+		self.stride = stride
+		self.source = source
+		size = len(tiles)
+		self.distances = array("l", [-1]) * size # -1 for tiles that cannot be reached.
+		self.parents = array("l", [NO_PARENT]) * size # The next tile on the way back to the source.
+		self.order = array("l", [0]) * size # When each tile was reached. Used to break ties the way a fresh search would.
+		self.reached: int = 0
+		self.pending = [] # Tiles that have become walkable since the field was last repaired.
+		self.build()
+
+	def build(self):
+		tiles = self.tiles
+		walkable = self.walkable
+		distances = self.distances
+		steps = neighbour_steps(self.stride)
+		distances[self.source] = 0
+		self.order[self.source] = self.reached
+		self.reached += 1
+		queue = deque((self.source,))
+		while queue:
+			current = queue.popleft()
+			distance = distances[current] + 1
+			for step in steps:
+				next_index = current + step
+				if distances[next_index] == -1 and walkable[tiles[next_index]]:
+					distances[next_index] = distance
+					self.parents[next_index] = current
+					self.order[next_index] = self.reached
+					self.reached += 1
+					queue.append(next_index)
+
+	# Brings the field up to date with the tiles that have become walkable since the last repair.
+	def repair(self):
+		if not self.pending:
+			return
+		tiles = self.tiles
+		walkable = self.walkable
+		distances = self.distances
+		steps = neighbour_steps(self.stride)
+		# Relaxation starts from the reached tiles next to the new ones, closest first.
+		heap = []
+		for index in self.pending:
+			for step in steps:
+				if distances[index + step] != -1:
+					heap.append((distances[index + step], index + step))
+		self.pending = []
+		heapq.heapify(heap)
+		while heap:
+			distance, current = heapq.heappop(heap)
+			if distance != distances[current]:
+				continue
+			distance += 1
+			for step in steps:
+				next_index = current + step
+				if walkable[tiles[next_index]] and (distances[next_index] == -1 or distances[next_index] > distance):
+					distances[next_index] = distance
+					self.parents[next_index] = current
+					self.order[next_index] = self.reached
+					self.reached += 1
+					heapq.heappush(heap, (distance, next_index))
+
+	def distance(self, index: int):
+		self.repair()
+		return self.distances[index]
+
+	# The path from {index} back to the source as a list of tile indices, or None if {index} cannot be reached.
+	def path_to_source(self, index: int):
+		self.repair()
+		if self.distances[index] == -1:
+			return None
+		path = []
+		while index != NO_PARENT:
+			path.append(index)
+			index = self.parents[index]
+		return path
+
+	# The path from the source to {index} as a list of tile indices, or None if {index} cannot be reached.
+	def path_from_source(self, index: int):
+		path = self.path_to_source(index)
+		if path is not None:
+			path.reverse()
+		return path
+
+	# The reachable tile in {targets} closest to the source, or None.
+	def nearest(self, targets):
+		self.repair()
+		distances = self.distances
+		order = self.order
+		best = None
+		best_key = None
+		for index in targets:
+			if distances[index] != -1:
+				key = (distances[index], order[index])
+				if best_key is None or key < best_key:
+					best = index
+					best_key = key
+		return best
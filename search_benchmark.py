@@ -0,0 +1,155 @@
+import argparse
+import json
+import random
+import sys
+import time
+import navigation
+import search
+
+# Compares the path searches in search.GridSearch on generated knowledge
+# grids, laid out the way navigation.Map stores them: a flat bytearray of
+# tile kinds with a border of unknown tiles.
+
+METHODS = {
+    'bfs': search.GridSearch.bfs,
+    'astar': search.GridSearch.shortest_path,
+    'jps': search.GridSearch.jump_path
+}
+
+
+def open_grid(width, height, rng):
+    stride = width + 2
+    tiles = bytearray([navigation.UNKNOWN]) * (stride * (height + 2))
+    for y in range(1, height + 1):
+        tiles[y * stride + 1:y * stride + 1 + width] = bytes([navigation.GRASS]) * width
+    return tiles, stride
+
+
+# A few walls with gaps in them split an open grid into large rooms.
+def rooms_grid(width, height, rng):
+    tiles, stride = open_grid(width, height, rng)
+    for x in range(rng.randint(8, 16), width, rng.randint(12, 24)):
+        for y in range(1, height + 1):
+            tiles[y * stride + x] = navigation.WALL
+        for gap in rng.sample(range(1, height + 1), 2):
+            tiles[gap * stride + x] = navigation.GRASS
+    for y in range(rng.randint(8, 16), height, rng.randint(12, 24)):
+        for x in range(1, width + 1):
+            tiles[y * stride + x] = navigation.WALL
+        for gap in rng.sample(range(1, width + 1), 2):
+            tiles[y * stride + gap] = navigation.GRASS
+    return tiles, stride
+
+
+# A perfect maze, carved by a depth first walk over the odd cells.
+def maze_grid(width, height, rng):
+    stride = width + 2
+    tiles = bytearray([navigation.UNKNOWN]) * (stride * (height + 2))
+    for y in range(1, height + 1):
+        tiles[y * stride + 1:y * stride + 1 + width] = bytes([navigation.WALL]) * width
+    start = stride + 1
+    tiles[start] = navigation.GRASS
+    stack = [start]
+    while stack:
+        current = stack[-1]
+        x, y = current % stride, current // stride
+        choices = []
+        for dx, dy in ((0, -2), (2, 0), (0, 2), (-2, 0)):
+            if 1 <= x + dx <= width and 1 <= y + dy <= height:
+                next_index = (y + dy) * stride + x + dx
+                if tiles[next_index] == navigation.WALL:
+                    choices.append((next_index, (y + dy // 2) * stride + x + dx // 2))
+        if not choices:
+            stack.pop()
+            continue
+        next_index, between = rng.choice(choices)
+        tiles[between] = navigation.GRASS
+        tiles[next_index] = navigation.GRASS
+        stack.append(next_index)
+    return tiles, stride
+
+
+GRIDS = {
+    'open': open_grid,
+    'rooms': rooms_grid,
+    'maze': maze_grid
+}
+
+
+def make_queries(tiles, count, rng):
+    walkable = [i for i, kind in enumerate(tiles) if navigation.WALKABLE[kind]]
+    return [tuple(rng.sample(walkable, 2)) for i in range(count)]
+
+
+def run_benchmark(grid_names, methods, size, queries, seed):
+    results = []
+    for grid_name in grid_names:
+        rng = random.Random(seed)
+        tiles, stride = GRIDS[grid_name](size, size, rng)
+        query_pairs = make_queries(tiles, queries, rng)
+        lengths = None
+        for method in methods:
+            grid_search = search.GridSearch()
+            find_path = METHODS[method]
+            expanded = 0
+            method_lengths = []
+            start_time = time.perf_counter()
+            for start, end in query_pairs:
+                path = find_path(grid_search, tiles, navigation.WALKABLE, stride, start, end)
+                expanded += grid_search.expanded
+                method_lengths.append(None if path is None else len(path))
+            elapsed = time.perf_counter() - start_time
+            # Every method finds shortest paths, so they must all agree on
+            # the lengths even where they pick different routes.
+            if lengths is None:
+                lengths = method_lengths
+            elif method_lengths != lengths:
+                raise AssertionError(f"{method} found paths of different lengths on {grid_name}")
+            results.append({
+                'grid': grid_name,
+                'method': method,
+                'size': size,
+                'queries': queries,
+                'mean_expanded': expanded / queries,
+                'mean_time_ms': elapsed * 1000 / queries
+            })
+    return results
+
+
+def print_results(results, out):
+    out.write(f"{'grid':<8}{'method':<8}{'expanded':>12}{'ms/query':>12}\n")
+    for result in results:
+        out.write(
+            f"{result['grid']:<8}{result['method']:<8}"
+            f"{result['mean_expanded']:>12.1f}{result['mean_time_ms']:>12.3f}\n"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare node expansions and run times of the grid path searches."
+    )
+    parser.add_argument(
+        "-g", "--grids", nargs="+", choices=list(GRIDS), default=list(GRIDS),
+        help="kinds of generated grid to search"
+    )
+    parser.add_argument(
+        "-m", "--methods", nargs="+", choices=list(METHODS), default=list(METHODS),
+        help="searches to compare"
+    )
+    parser.add_argument("-s", "--size", type=int, default=101, help="width and height of each grid")
+    parser.add_argument("-q", "--queries", type=int, default=200, help="random start and end pairs per grid")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the grids and queries")
+    parser.add_argument("--json", action="store_true", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.grids, args.methods, args.size, args.queries, args.seed)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print_results(results, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
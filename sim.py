@@ -1,8 +1,12 @@
+import contextlib
+import functools
 import world
 import aiA
 import aiB
-import display
+import simlog
 import time
+import timing
+from array import array
 
 DIRECTIONS = {
     "N": (0, -1),
@@ -21,359 +25,299 @@ VALID_COMMANDS = [
 ]
 
 
+# The agents take their turns in the order of ai_factories, which must
+# match the agent starts in the world's header. Without it, a world with
+# two agents is played by ai_factoryA and ai_factoryB, and other worlds by
+# team() of their size.
+# log may be a text file, a simlog.SimLog, or None for stdout.
+# The display draws at most one frame every display_speed seconds while
+# the sim runs at full speed. pygame has to keep the main thread, so with
+# the display the sim is played on a worker thread instead. With
+# pace_display set, the sim waits display_speed seconds every turn so
+# that every turn can be watched.
+# With a timing.Profile, the sim and the agents record how long each phase
+# of every turn takes into it. With a replay.Recorder, every command and
+# trigger is recorded so that the run can be replayed. With a
+# frames.FrameExporter, the run is also drawn to image files.
 def run_sim(
     the_world, 
     max_turns=None, 
     log=None, 
     use_display=False,
-    display_speed=0.5
+    display_speed=0.5,
+    ai_factoryA=aiA.AI,
+    ai_factoryB=aiB.AI,
+    profile=None,
+    recorder=None,
+    pace_display=False,
+    frames=None,
+    ai_factories=None
 ):
+    ai_factories = players(the_world, ai_factories, ai_factoryA, ai_factoryB)
+    sim_log = open_log(log)
+    disp = None
+    if use_display:
+        import display
+        disp = display.DisplayLoop(the_world, display_speed)
+
+    # The profile is entered on the thread that plays, as it is kept per
+    # thread.
+    def run():
+        profiling = profile.active() if profile is not None else contextlib.nullcontext()
+        with profiling:
+            return play(
+                the_world,
+                max_turns,
+                sim_log,
+                disp,
+                display_speed,
+                ai_factories,
+                recorder,
+                pace_display,
+                frames
+            )
+
+    try:
+        if disp is not None:
+            return disp.run_beside(run)
+        return run()
+    finally:
+        sim_log.close()
+
+
+# The AIs that play a world, one per agent start: ai_factories, checked
+# against the world, or by default ai_factoryA and ai_factoryB for a world
+# with two agents and team() of its size for any other.
+def players(the_world, ai_factories=None, ai_factoryA=aiA.AI, ai_factoryB=aiB.AI):
+    num_agents = len(the_world.get_starts())
+    if ai_factories is None:
+        if num_agents == 2:
+            ai_factories = [ai_factoryA, ai_factoryB]
+        else:
+            ai_factories = team(num_agents)
+    if len(ai_factories) != num_agents:
+        raise ValueError(
+            f"{len(ai_factories)} agents cannot play a world with {num_agents} agent starts."
+        )
+    return ai_factories
+
+
+# The default AIs for a team of any size. The first sets up the navigation
+# the team shares, and the others follow its lead.
+def team(size):
+    return [functools.partial(aiA.AI, num_bots=size)] + [aiB.AI] * (size - 1)
+
+
+def play(
+    the_world,
+    max_turns,
+    log,
+    disp,
+    display_speed,
+    ai_factories,
+    recorder,
+    pace_display,
+    frames
+):
+
+    profile = timing.current()
 
     POINTS_PER_GOAL = 0
     if max_turns is not None:
         POINTS_PER_GOAL = max_turns
-    
-    the_aiA = aiA.AI(max_turns)
-    the_aiB = aiB.AI(max_turns)
-
-    agent_xA, agent_yA = the_world.get_startxyA()
-    agent_xB, agent_yB = the_world.get_startxyB()
-    agent_facingA = the_world.get_start_face_dirA()
-    agent_facingB = the_world.get_start_face_dirB()
-    cells_visited = []
-    turn = 1
-    agent_cmdA = "X"
-    agent_cmdB = "X"
-    msgA = None
-    msgB = None
-    perceptsA = {}
-    perceptsB = {}
-    pointsA = 0
-    pointsB = 0
-    aiA_state = 'GOOD'
-    aiB_state = 'GOOD'
 
-    disp = None
-
-    if use_display:
-        import display
-        disp = display.Display(
-            the_world,
-            agent_xA,
-            agent_yA,
-            agent_xB,
-            agent_yB
-        )
+    ais = [factory(max_turns) for factory in ai_factories]
+    num_agents = len(ais)
+    names = world.World.AGENT_NAMES[:num_agents]
+
+    # Everything the sim tracks for each agent, indexed by turn order. An
+    # agent that has exited keeps its last position, but has no facing.
+    starts = the_world.get_starts()
+    agent_x = array('i', [x for x, y, facing in starts])
+    agent_y = array('i', [y for x, y, facing in starts])
+    facings = [facing for x, y, facing in starts]
+    points = array('i', [0]) * num_agents
+    states = ['GOOD'] * num_agents
+    # The message each agent sent on its last turn. Each agent is handed
+    # the latest message of the agent before it.
+    messages = [None] * num_agents
+    turn = 1
+    turns_played = 0
 
-    if use_display:
-        disp.update(
-            agent_xA,
-            agent_yA,
-            agent_facingA,
-            agent_xB,
-            agent_yB,
-            agent_facingB
-        )
-        time.sleep(display_speed)
+    if disp is not None:
+        disp.update(agent_views(agent_x, agent_y, facings, states))
+        if pace_display:
+            time.sleep(display_speed)
 
-    
+    if frames is not None:
+        frames.update(agent_views(agent_x, agent_y, facings, states))
 
     run = True
     while run:
 
-        
-        if aiA_state != 'GOOD' and aiB_state != 'GOOD':
+        if 'GOOD' not in states:
             run = False
-            write_to_log(
-                log,
-                f"-----Scenario finished-----"
-            )
-            write_to_log(
-                log,
-                f"FINAL AGENT STATES:\nAgent A {aiA_state}\nAgent B {aiB_state}"
+            log.message(simlog.SUMMARY, "-----Scenario finished-----")
+            log.message(
+                simlog.SUMMARY,
+                "FINAL AGENT STATES:" + "".join(f"\nAgent {name} {state}" for name, state in zip(names, states))
             )
             continue
         else:
-            write_to_log(
-                log,
-                f"-----Turn {turn}-----"
-            )
-        
-        if aiA_state == 'GOOD':
-            pointsA += 1
-            
-            # What does the agent see?
-            perceptsA = get_percepts(the_world, agent_xA, agent_yA, agent_facingA)
-            
-            # Get agent's command
-            agent_cmdA, msgA = the_aiA.update(perceptsA, msgB)
-            
-            # LOG ###############################################################
-            
-            write_to_log(
-                log,
-                f"Agent A"
-            )
-            write_to_log(
-                log,
-                f"   Start:    {agent_xA},{agent_yA}"
-            )
-            percept_str = ""
-            for k, v in perceptsA.items():
-                percept_str += f"({k} {v}) "
-            write_to_log(
-                log,
-                f"   Percepts: {percept_str}"
-            )
-            write_to_log(
-                log,
-                f"   Command:  {agent_cmdA}"
-            )
-
-            # ####################################################################
+            turns_played = turn
+            turn_start = profile.clock()
+            log.turn(turn)
+
+        # What every agent sees is worked out together, from where the
+        # agents are when their turns come. Moving does not change what the
+        # others see, but goals change cells, so the views of the agents
+        # after a goal is triggered are worked out again.
+        views = None
+        for i in range(num_agents):
+            if states[i] != 'GOOD':
+                continue
+            name = names[i]
+            points[i] += 1
+            x = agent_x[i]
+            y = agent_y[i]
 
-            # Move the agent
-            if validate_agent_cmd(agent_cmdA):
-
-                new_agent_x = agent_xA
-                new_agent_y = agent_yA
-
-                match agent_cmdA:
-                    case 'N' | 'E' | 'S' | 'W':
-                        dx, dy = DIRECTIONS[agent_cmdA]
-                        new_agent_x = agent_xA + dx
-                        new_agent_y = agent_yA + dy
-                        if the_world.is_cell_enterable(new_agent_x, new_agent_y):
-                            agent_xA = new_agent_x
-                            agent_yA = new_agent_y
-
-
-                trigger = the_world.check_triggers(agent_xA, agent_yA, agent_cmdA)
-                match trigger[0]:
-                    case "EXIT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent A has left the environment."
-                        )
-                        aiA_state = 'EXITED'
-                        agent_xA = None
-                        agent_yA = None
-                        agent_facingA = None
-                    case "TELEPORT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent A teleported from {the_world.get_cell(agent_xA, agent_yA)} to {the_world.get_cell(trigger[1], trigger[2])}"
-                        )
-                        agent_xA = trigger[1]
-                        agent_yA = trigger[2]
-
-                    case "GOAL_TRIGGERED":
-                        # if trigger[1] == 0:
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Agent A activated goal {trigger[2]}"
-                        #     )
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Your team has completed this map in {turn} turns. SUCCESS"
-                        #     )
-                        #     run = False
-                        # else:
-                        pointsA += POINTS_PER_GOAL
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent A activated goal {trigger[2]}"
-                        )
-                    case "NONE":
-                        pass
-
-
-                write_to_log(
-                    log,
-                    f"   End:      {agent_xA},{agent_yA}"
-                )
-
-            else:
-                write_to_log(log, f"Agent A invalid command: {agent_cmdA}")
-                write_to_log(log, "Agent A - FAILURE")
-                aiA_state = 'BAD'
-
-        if aiB_state == 'GOOD':
-            pointsB += 1
-            
             # What does the agent see?
-            perceptsB = get_percepts(the_world, agent_xB, agent_yB, agent_facingB)
+            phase_start = profile.clock()
+            if views is None:
+                views = the_world.views(agent_x[i:], agent_y[i:])
+                first_view = i
+            percepts = percepts_from_view(views[i - first_view])
+            phase_start = profile.lap("sim.percepts", phase_start)
 
             # Get agent's command
-            agent_cmdB, msgB = the_aiB.update(perceptsB, msgA)
+            cmd, messages[i] = ais[i].update(percepts, messages[i - 1])
+            phase_start = profile.lap("sim.update", phase_start)
+            if recorder is not None:
+                recorder.command(name, cmd)
 
-            # LOG ###############################################################
-            write_to_log(
-                log,
-                f"Agent B"
-            )
-            write_to_log(
-                log,
-                f"   Start:    {agent_xB},{agent_yB}"
-            )
-            percept_str = ""
-            for k, v in perceptsB.items():
-                percept_str += f"({k} {v}) "
-            write_to_log(
-                log,
-                f"   Percepts: {percept_str}"
-            )
-            write_to_log(
-                log,
-                f"   Command:  {agent_cmdB}"
-            )
+            start = (x, y)
+            agent_trigger = None
 
-            # ####################################################################
+            if not validate_agent_cmd(cmd):
+                log.invalid_command(turn, name, start, percepts, cmd)
+                states[i] = 'BAD'
+                continue
 
             # Move the agent
-            if validate_agent_cmd(agent_cmdB):
-
-                new_agent_x = agent_xB
-                new_agent_y = agent_yB
-
-                match agent_cmdB:
-                    case 'N' | 'E' | 'S' | 'W':
-                        dx, dy = DIRECTIONS[agent_cmdB]
-                        new_agent_x = agent_xB + dx
-                        new_agent_y = agent_yB + dy
-                        if the_world.is_cell_enterable(new_agent_x, new_agent_y):
-                            agent_xB = new_agent_x
-                            agent_yB = new_agent_y
-
-
-                trigger = the_world.check_triggers(agent_xB, agent_yB, agent_cmdB)
-                match trigger[0]:
-                    case "EXIT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent B has left the environment."
-                        )
-                        aiB_state = 'EXITED'
-                        agent_xB = None
-                        agent_yB = None
-                        agent_facingB = None
-                    case "TELEPORT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent B teleported from {the_world.get_cell(agent_xB, agent_yB)} to {the_world.get_cell(trigger[1], trigger[2])}"
-                        )
-                        agent_xB = trigger[1]
-                        agent_yB = trigger[2]
-
-                    case "GOAL_TRIGGERED":
-                        # if trigger[1] == 0:
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Agent B activated goal {trigger[2]}"
-                        #     )
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Your team has completed this map in {turn} turns. SUCCESS"
-                        #     )
-                        #     run = False
-                        # else:
-                        pointsB += POINTS_PER_GOAL
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent B activated goal {trigger[2]}"
-                        )
-                    case "NONE":
-                        pass
-
-
-                write_to_log(
-                    log,
-                    f"   End:      {agent_xB},{agent_yB}"
-                )
-
-
-            else:
-                write_to_log(log, f"Agent B invalid command: {agent_cmdB}")
-                write_to_log(log, "Agent B - FAILURE")
-                aiB_state = 'BAD'
-            
-
-        if use_display:
-            disp.update(
-                agent_xA,
-                agent_yA,
-                agent_facingA,
-                agent_xB,
-                agent_yB,
-                agent_facingB
-            )
+            match cmd:
+                case 'N' | 'E' | 'S' | 'W':
+                    dx, dy = DIRECTIONS[cmd]
+                    if the_world.is_cell_enterable(x + dx, y + dy):
+                        x += dx
+                        y += dy
+
+            trigger = the_world.check_triggers(x, y, cmd)
+            if recorder is not None:
+                recorder.trigger(turn, name, trigger)
+            end = (x, y)
+            match trigger[0]:
+                case "EXIT":
+                    agent_trigger = ("EXIT",)
+                    states[i] = 'EXITED'
+                    facings[i] = None
+                    end = (None, None)
+                case "TELEPORT":
+                    if log.enabled(simlog.TURNS):
+                        agent_trigger = ("TELEPORT", the_world.get_cell(x, y), the_world.get_cell(trigger[1], trigger[2]))
+                    x = trigger[1]
+                    y = trigger[2]
+                    end = (x, y)
+                case "GOAL_TRIGGERED":
+                    points[i] += POINTS_PER_GOAL
+                    agent_trigger = ("GOAL_TRIGGERED", trigger[2])
+                    views = None
+                case "NONE":
+                    pass
+            agent_x[i] = x
+            agent_y[i] = y
+
+            phase_start = profile.lap("sim.triggers", phase_start)
+            log.agent(turn, name, start, percepts, cmd, agent_trigger, end)
+            profile.lap("sim.log", phase_start)
+
+        if disp is not None:
+            phase_start = profile.clock()
+            disp.update(agent_views(agent_x, agent_y, facings, states))
+            profile.lap("sim.display", phase_start)
+        if frames is not None:
+            phase_start = profile.clock()
+            frames.update(agent_views(agent_x, agent_y, facings, states))
+            profile.lap("sim.frames", phase_start)
+        # The whole turn, apart from the pause for the display.
+        profile.lap("sim.turn", turn_start)
+        if disp is not None and pace_display:
             time.sleep(display_speed)
 
         if max_turns is not None:
             if turn >= max_turns:
-                write_to_log(
-                    log,
-                    f"---MAX TURNS REACHED---"
-                )
+                log.message(simlog.SUMMARY, "---MAX TURNS REACHED---")
                 run = False
                 continue
             
         turn += 1
 
 
-    A_points_scored = pointsA if aiA_state == 'EXITED' else 0
-    B_points_scored = pointsB if aiB_state == 'EXITED' else 0
-        
-    write_to_log(
-        log,
-        f"\nFINAL SCORE"
-    )
-    write_to_log(
-        log,
-        f"Agent A received {pointsA} points and scored {A_points_scored} points."
-    )
-    write_to_log(
-        log,
-        f"Agent B received {pointsB} points and scored {B_points_scored} points."
-    )
-    write_to_log(
-        log,
-        f"TOTAL: {A_points_scored + B_points_scored}"
-    )
+    if recorder is not None:
+        recorder.turns = turns_played
+
+    scored = [points[i] if states[i] == 'EXITED' else 0 for i in range(num_agents)]
+
+    log.message(simlog.SUMMARY, "\nFINAL SCORE")
+    for i, name in enumerate(names):
+        log.message(simlog.SUMMARY, f"Agent {name} received {points[i]} points and scored {scored[i]} points.")
+    log.message(simlog.SUMMARY, f"TOTAL: {sum(scored)}")
         
-    if use_display:
-        disp.quit()
+    if frames is not None:
+        frames.close()
+
+    result = {'turns': turns_played}
+    result.update({f"state{name}": states[i] for i, name in enumerate(names)})
+    result.update({f"points{name}": points[i] for i, name in enumerate(names)})
+    result.update({f"scored{name}": scored[i] for i, name in enumerate(names)})
+    result['total'] = sum(scored)
+    return result
+
+# Where each agent is for the display, as (x, y, facing), or
+# (None, None, None) for an agent that has exited.
+def agent_views(agent_x, agent_y, facings, states):
+    return [
+        (None, None, None) if state == 'EXITED' else (x, y, facing)
+        for x, y, facing, state in zip(agent_x, agent_y, facings, states)
+    ]
 
 def get_percepts(the_world, agent_x, agent_y, agent_facing):
-    # percepts = the_world.get_cells_around(agent_x, agent_y)
-    percepts = {'X':[the_world.get_cell(agent_x, agent_y)]}
-    for d, v in DIRECTIONS.items():
-        dx, dy = v
-        ray = the_world.raycast(agent_x, agent_y, dx, dy)
-        ray = the_world.prune_raycast(ray)
-        percepts[d] = ray
-
-    # percepts = [the_world.get_cell(agent_x, agent_y)]
-    # dx, dy = DIRECTIONS[agent_facing]
-    # ray = the_world.raycast(
-    #     agent_x,
-    #     agent_y,
-    #     dx, dy
-    # )
-    # ray = the_world.prune_raycast(ray)
-    # percepts += ray
-    return percepts
+    return percepts_from_view(the_world.views((agent_x,), (agent_y,))[0])
+
+
+# Turns a view from World.views into the percepts the agents are given.
+def percepts_from_view(view):
+    cell, north, east, south, west = view
+    return {
+        'X': [chr(cell[0])],
+        'N': list(north.decode('ascii')),
+        'E': list(east.decode('ascii')),
+        'S': list(south.decode('ascii')),
+        'W': list(west.decode('ascii'))
+    }
 
 
 def validate_agent_cmd(cmd):
     return cmd in VALID_COMMANDS
 
-def write_to_log(log, msg):
-    if log is not None:
-        log.write(f"{msg}\n")
-        log.flush()
-    else:
-        print(msg)
+# Wraps what run_sim was given to log to. A file gets a text log written
+# in the background. With no log, the text goes straight to stdout, where
+# it has to stay in step with what the agents print.
+def open_log(log):
+    if isinstance(log, simlog.SimLog):
+        return log
+    if log is None:
+        return simlog.SimLog(background=False, batch_size=1)
+    return simlog.SimLog(log)
 
 def turn_right(cur_facing):
     match cur_facing:
@@ -0,0 +1,189 @@
+# Structured, buffered logging for simulations.
+#
+# run_sim describes each turn as records (turn, agent, start, percepts,
+# command, trigger, end) instead of formatted lines. Records are collected
+# in a buffer and handed over in batches to a background thread, which
+# encodes them as text or JSONL and writes each batch with a single call.
+# Records above the log's level are never built or encoded.
+
+import json
+import queue
+import sys
+import threading
+
+# Levels, from least to most detail.
+QUIET = 0 # Nothing is logged.
+SUMMARY = 1 # How the scenario ended and the final score.
+TURNS = 2 # Everything each agent saw and did every turn.
+LEVELS = {'quiet': QUIET, 'summary': SUMMARY, 'turns': TURNS}
+
+# How many records are buffered before they are handed to the writer.
+BATCH_SIZE = 512
+
+
+def trigger_text(agent, trigger):
+    match trigger[0]:
+        case "EXIT":
+            return f"Agent {agent} has left the environment."
+        case "TELEPORT":
+            return f"Agent {agent} teleported from {trigger[1]} to {trigger[2]}"
+        case "GOAL_TRIGGERED":
+            return f"Agent {agent} activated goal {trigger[1]}"
+
+
+# The same text the sim has always logged.
+def encode_text(record):
+    match record[0]:
+        case "turn":
+            return f"-----Turn {record[1]}-----\n"
+        case "agent":
+            kind, turn, agent, start, percepts, command, trigger, end = record
+            percept_str = ""
+            for k, v in percepts.items():
+                percept_str += f"({k} {v}) "
+            text = (
+                f"Agent {agent}\n"
+                f"   Start:    {start[0]},{start[1]}\n"
+                f"   Percepts: {percept_str}\n"
+                f"   Command:  {command}\n"
+            )
+            if trigger is not None:
+                text += f"   Trigger:  {trigger_text(agent, trigger)}\n"
+            return text + f"   End:      {end[0]},{end[1]}\n"
+        case "invalid":
+            kind, turn, agent, start, percepts, command = record
+            percept_str = ""
+            for k, v in percepts.items():
+                percept_str += f"({k} {v}) "
+            return (
+                f"Agent {agent}\n"
+                f"   Start:    {start[0]},{start[1]}\n"
+                f"   Percepts: {percept_str}\n"
+                f"   Command:  {command}\n"
+                f"Agent {agent} invalid command: {command}\n"
+                f"Agent {agent} - FAILURE\n"
+            )
+        case "message":
+            return f"{record[2]}\n"
+
+
+# One JSON object per line. Turn headers are left out, as every agent
+# record carries its turn.
+def encode_jsonl(record):
+    match record[0]:
+        case "turn":
+            return ""
+        case "agent":
+            kind, turn, agent, start, percepts, command, trigger, end = record
+            return json.dumps({
+                'turn': turn,
+                'agent': agent,
+                'start': start,
+                'percepts': percepts,
+                'command': command,
+                'trigger': trigger,
+                'end': end
+            }, separators=(',', ':')) + "\n"
+        case "invalid":
+            kind, turn, agent, start, percepts, command = record
+            return json.dumps({
+                'turn': turn,
+                'agent': agent,
+                'start': start,
+                'percepts': percepts,
+                'command': command,
+                'invalid': True
+            }, separators=(',', ':')) + "\n"
+        case "message":
+            return json.dumps({'level': record[1], 'message': record[2]}, separators=(',', ':')) + "\n"
+
+
+ENCODERS = {'text': encode_text, 'jsonl': encode_jsonl}
+
+
+class SimLog:
+
+    # out is any writable text file, or None for stdout. With background
+    # set, batches are encoded and written on a writer thread; otherwise
+    # they are written as soon as they fill.
+    def __init__(self, out=None, fmt='text', level=TURNS, background=True, batch_size=BATCH_SIZE):
+        if fmt not in ENCODERS:
+            raise ValueError(f"Unknown log format: {fmt}")
+        self.out = out
+        self.encode = ENCODERS[fmt]
+        self.level = level
+        self.batch_size = batch_size
+        self.buffer = []
+        self.error = None
+        self.writer = None
+        if background and level > QUIET:
+            self.batches = queue.SimpleQueue()
+            self.writer = threading.Thread(target=self.write_batches, daemon=True)
+            self.writer.start()
+
+    def enabled(self, level):
+        return level <= self.level
+
+    def turn(self, turn):
+        if self.level >= TURNS:
+            self.emit(("turn", turn))
+
+    # start and end are (x, y). trigger is None, ("EXIT",),
+    # ("TELEPORT", from_cell, to_cell) or ("GOAL_TRIGGERED", goal).
+    def agent(self, turn, agent, start, percepts, command, trigger, end):
+        if self.level >= TURNS:
+            self.emit(("agent", turn, agent, start, percepts, command, trigger, end))
+
+    def invalid_command(self, turn, agent, start, percepts, command):
+        if self.level >= SUMMARY:
+            self.emit(("invalid", turn, agent, start, percepts, command))
+
+    def message(self, level, text):
+        if self.level >= level:
+            self.emit(("message", level, text))
+
+    def emit(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self.hand_off()
+
+    def hand_off(self):
+        batch = self.buffer
+        self.buffer = []
+        if self.writer is not None:
+            self.batches.put(batch)
+        else:
+            self.write(batch)
+
+    def write(self, batch):
+        out = self.out if self.out is not None else sys.stdout
+        out.write("".join([self.encode(record) for record in batch]))
+        out.flush()
+
+    def write_batches(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            if self.error is None:
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    # Raised again from close() on the simulation's thread.
+                    self.error = e
+
+    # Writes everything logged so far. The file itself is left open.
+    def close(self):
+        if self.buffer:
+            self.hand_off()
+        if self.writer is not None:
+            self.batches.put(None)
+            self.writer.join()
+            self.writer = None
+        if self.error is not None:
+            raise self.error
+
+
+# A log that records nothing, for batch runs.
+def quiet():
+    return SimLog(level=QUIET)
@@ -0,0 +1,72 @@
+import contextlib
+import io
+import pytest
+import navigation
+import sim
+import simlog
+import worldgen
+
+# Checks that a team sharing one NavigationManager plans every turn for the agent whose turn it is, before and after some of its agents have exited,
+# and that a bot with nothing left to do waits without using the tile it stands on.
+
+
+# Wraps an AI, and records which bot the shared manager is set to whenever the AI is handed it.
+class CheckedAI(object):
+	def __init__(self, ai, index, seen):
+		self.ai = ai
+		self.index = index
+		self.seen = seen
+
+	def update(self, percepts, msg):
+		if msg is not None:
+			self.seen.append((self.index, msg.current_bot, frozenset(msg.exited_bots)))
+		return self.ai.update(percepts, msg)
+
+
+def checked_team(size, seen):
+	return [
+		lambda max_turns, index=index, factory=factory: CheckedAI(factory(max_turns), index, seen)
+		for index, factory in enumerate(sim.team(size))
+	]
+
+
+@pytest.mark.parametrize("size", [3, 4])
+def test_current_bot_follows_turns(size):
+	# One of the agents exits long before the others in this world.
+	the_world = worldgen.generate(24, 24, "rooms", 2, 3, 1, agents=size)
+	seen = []
+	with contextlib.redirect_stdout(io.StringIO()):
+		result = sim.run_sim(the_world, 400, simlog.quiet(), ai_factories=checked_team(size, seen))
+	assert any(exited for index, bot, exited in seen)
+	assert [(index, bot) for index, bot, exited in seen] == [(index, index) for index, bot, exited in seen]
+	assert all(result[f"state{name}"] == "EXITED" for name in "ABCD"[:size])
+
+
+# A manager for one bot that has seen its surroundings and has nothing left to explore.
+def idle_manager(percepts):
+	manager = navigation.NavigationManager(num_bots=1)
+	manager.scan(percepts)
+	manager.discover = lambda: []
+	return manager
+
+
+def test_waiting_on_grass_uses_it():
+	manager = idle_manager({"X": ["g"], "N": ["w"], "E": ["g", "w"], "S": ["w"], "W": ["w"]})
+	assert manager.next_direction("g") == "U"
+
+
+@pytest.mark.parametrize("below", list("bopyr"))
+def test_waiting_walks_into_a_wall(below):
+	manager = idle_manager({"X": [below], "N": ["g", "w"], "E": ["w"], "S": ["g", "w"], "W": ["g", "w"]})
+	assert manager.next_direction(below) == "E"
+	position = manager.bot_coordinates[0]
+	assert (position.world, position.x, position.y) == (0, 0, 0)
+
+
+@pytest.mark.parametrize("below", list("bopyr"))
+def test_waiting_steps_off_without_walls(below):
+	manager = idle_manager({"X": [below], "N": ["g", "w"], "E": ["g", "w"], "S": ["g", "w"], "W": ["g", "w"]})
+	assert manager.next_direction(below) == "N"
+	position = manager.bot_coordinates[0]
+	assert (position.world, position.x, position.y) == (0, 0, -1)
+	assert manager.next_direction("g") == "U"
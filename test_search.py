@@ -0,0 +1,196 @@
+import random
+import pytest
+import navigation
+import search
+
+# Checks the searches in search.py against the breadth first search the navigation code used before them, which took tiles off the front of a list with pop(0).
+# Every search has to find paths of the same length, and the breadth first ones the very same paths.
+
+WALKABLE = navigation.WALKABLE
+
+# Grids are written as rows of tile kinds: w is a wall, ? a tile that has not been seen, and anything else can be walked on.
+# Every grid is surrounded by walls, as the searches expect.
+GRIDS = {
+	"open": [
+		"wwwwwwwwwwww",
+		"wggggggggggw",
+		"wggggggggggw",
+		"wggggggggggw",
+		"wggggggggggw",
+		"wggggggggggw",
+		"wwwwwwwwwwww",
+	],
+	"maze": [
+		"wwwwwwwwwwwwwww",
+		"wgggwgggggggggw",
+		"wgwgwgwwwwwgwgw",
+		"wgwgggwgggwgwgw",
+		"wgwwwwwgwgwgwgw",
+		"wgggggwgwgggwgw",
+		"wwwwwgwgwwwwwgw",
+		"wgggwgggwgggggw",
+		"wgwgwwwgwgwwwww",
+		"wgwgggggwgggggw",
+		"wwwwwwwwwwwwwww",
+	],
+	"unknown": [
+		"wwwwwwwwwwww",
+		"wggg??gggggw",
+		"wgwg??gwwwgw",
+		"wgwgggg?ggrw",
+		"wgw??wgwgwgw",
+		"wggggwggg1gw",
+		"wwwwwwwwwwww",
+	],
+	# The right half cannot be reached from the left.
+	"unreachable": [
+		"wwwwwwwwwwwww",
+		"wggggwwggrggw",
+		"wgwggw?ggwggw",
+		"wggggwwgggggw",
+		"wwwwwwwwwwwww",
+	],
+}
+
+
+def make_grid(rows):
+	return bytearray("".join(rows), "ascii"), len(rows[0])
+
+
+def walkable_tiles(tiles):
+	return [index for index, kind in enumerate(tiles) if WALKABLE[kind]]
+
+
+# The breadth first search from before search.py, on the flat grid. Returns the path to the first target it takes off the queue, or None.
+def reference_path(tiles, stride, start, targets):
+	previous = {start: None}
+	queue = [start]
+	while queue:
+		current = queue.pop(0)
+		if current in targets:
+			path = []
+			while current is not None:
+				path.append(current)
+				current = previous[current]
+			path.reverse()
+			return path
+		for step in (-stride, 1, stride, -1):
+			next_index = current + step
+			if WALKABLE[tiles[next_index]] and next_index not in previous:
+				previous[next_index] = current
+				queue.append(next_index)
+	return None
+
+
+def reference_length(tiles, stride, start, end):
+	path = reference_path(tiles, stride, start, (end,))
+	return None if path is None else len(path)
+
+
+def path_length(path):
+	return None if path is None else len(path)
+
+
+# Every step of a path goes to a neighbouring walkable tile.
+def check_steps(path, tiles, stride):
+	for index, next_index in zip(path, path[1:]):
+		assert abs(next_index - index) in (1, stride)
+		assert WALKABLE[tiles[next_index]]
+
+
+def pairs(tiles):
+	cells = walkable_tiles(tiles)
+	return [(start, end) for start in cells for end in cells]
+
+
+@pytest.mark.parametrize("name", GRIDS)
+def test_bfs_matches_reference(name):
+	tiles, stride = make_grid(GRIDS[name])
+	grid_search = search.GridSearch()
+	for start, end in pairs(tiles):
+		assert grid_search.bfs(tiles, WALKABLE, stride, start, end) == reference_path(tiles, stride, start, (end,))
+
+
+@pytest.mark.parametrize("name", GRIDS)
+def test_nearest_matches_reference(name):
+	tiles, stride = make_grid(GRIDS[name])
+	grid_search = search.GridSearch()
+	rng = random.Random(name)
+	cells = walkable_tiles(tiles)
+	for start in cells:
+		targets = set(rng.sample(cells, 3))
+		assert grid_search.nearest(tiles, WALKABLE, stride, start, targets) == reference_path(tiles, stride, start, targets)
+
+
+@pytest.mark.parametrize("name", GRIDS)
+def test_shortest_path_lengths(name):
+	tiles, stride = make_grid(GRIDS[name])
+	grid_search = search.GridSearch()
+	for start, end in pairs(tiles):
+		path = grid_search.shortest_path(tiles, WALKABLE, stride, start, end)
+		assert path_length(path) == reference_length(tiles, stride, start, end)
+		if path is not None:
+			assert path[0] == start and path[-1] == end
+			check_steps(path, tiles, stride)
+
+
+@pytest.mark.parametrize("name", GRIDS)
+def test_jump_path_lengths(name):
+	tiles, stride = make_grid(GRIDS[name])
+	grid_search = search.GridSearch()
+	for start, end in pairs(tiles):
+		path = grid_search.jump_path(tiles, WALKABLE, stride, start, end)
+		assert path_length(path) == reference_length(tiles, stride, start, end)
+		if path is not None:
+			assert path[0] == start and path[-1] == end
+			check_steps(path, tiles, stride)
+
+
+@pytest.mark.parametrize("name", GRIDS)
+def test_distance_field_distances(name):
+	tiles, stride = make_grid(GRIDS[name])
+	for source in walkable_tiles(tiles):
+		field = search.DistanceField(tiles, WALKABLE, stride, source)
+		for index in range(len(tiles)):
+			length = reference_length(tiles, stride, source, index) if WALKABLE[tiles[index]] else None
+			assert field.distance(index) == (-1 if length is None else length - 1)
+			path = field.path_from_source(index)
+			assert path_length(path) == length
+
+
+# Uncovering the unknown tiles one at a time, and repairing the field after each, gives the same distances as searching the grid again.
+def test_distance_field_repair():
+	tiles, stride = make_grid(GRIDS["unknown"])
+	source = walkable_tiles(tiles)[0]
+	field = search.DistanceField(tiles, WALKABLE, stride, source)
+	for index in [index for index, kind in enumerate(tiles) if kind == navigation.UNKNOWN]:
+		tiles[index] = navigation.GRASS
+		field.pending.append(index)
+		for other in walkable_tiles(tiles):
+			assert field.distance(other) == reference_length(tiles, stride, source, other) - 1
+
+
+# Seeded random grids with walls and unknown tiles scattered over them, for the cases the fixed grids miss.
+def test_random_grids():
+	rng = random.Random(7)
+	grid_search = search.GridSearch()
+	for trial in range(40):
+		width = rng.randint(3, 20)
+		height = rng.randint(3, 20)
+		stride = width + 2
+		tiles = bytearray(b"w") * (stride * (height + 2))
+		density = rng.random() * 0.4
+		for y in range(1, height + 1):
+			for x in range(1, width + 1):
+				tiles[y * stride + x] = ord("w") if rng.random() < density else ord(rng.choice("gggggg?"))
+		cells = walkable_tiles(tiles)
+		if len(cells) < 2:
+			continue
+		for query in range(20):
+			start, end = rng.sample(cells, 2)
+			length = reference_length(tiles, stride, start, end)
+			assert grid_search.bfs(tiles, WALKABLE, stride, start, end) == reference_path(tiles, stride, start, (end,))
+			assert path_length(grid_search.shortest_path(tiles, WALKABLE, stride, start, end)) == length
+			assert path_length(grid_search.jump_path(tiles, WALKABLE, stride, start, end)) == length
+			field = search.DistanceField(tiles, WALKABLE, stride, start)
+			assert field.distance(end) == (-1 if length is None else length - 1)
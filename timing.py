@@ -0,0 +1,132 @@
+# Per-phase timers and counters for finding where the time in a turn goes.
+#
+# Code that wants to be measured asks for the current profile and laps it
+# around each phase:
+#
+#   profile = timing.current()
+#   start = profile.clock()
+#   ...
+#   start = profile.lap("nav.scan", start)
+#
+# Outside of a profiled run, current() is a profile that does nothing, so
+# the hooks cost a couple of method calls. run_sim makes a profile current
+# for its own thread only, so simulations on other threads are not mixed in.
+
+import contextlib
+import json
+import threading
+import time
+from array import array
+
+state = threading.local()
+
+
+class Histogram:
+
+    def __init__(self):
+        self.samples = array('d')
+
+    def add(self, value):
+        self.samples.append(value)
+
+    # The value that p percent of the samples are at or below.
+    def percentile(self, p):
+        ordered = sorted(self.samples)
+        rank = max(1, -(-len(ordered) * p // 100))
+        return ordered[rank - 1]
+
+    def summary(self):
+        if not self.samples:
+            return {'count': 0}
+        total = sum(self.samples)
+        # Reported in milliseconds.
+        return {
+            'count': len(self.samples),
+            'total_ms': total * 1000,
+            'mean_ms': total * 1000 / len(self.samples),
+            'p50_ms': self.percentile(50) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': max(self.samples) * 1000
+        }
+
+
+class Profile:
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+
+    def clock(self):
+        return time.perf_counter()
+
+    # Records the time since start against phase, and returns the time now
+    # so that the next phase can start from it.
+    def lap(self, phase, start):
+        now = time.perf_counter()
+        self.add(phase, now - start)
+        return now
+
+    def add(self, phase, seconds):
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.add(seconds)
+
+    def count(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    # Makes this the current profile on this thread for the duration.
+    @contextlib.contextmanager
+    def active(self):
+        previous = getattr(state, 'profile', None)
+        state.profile = self
+        try:
+            yield self
+        finally:
+            state.profile = previous
+
+    def report(self):
+        return {
+            'phases': {phase: self.phases[phase].summary() for phase in sorted(self.phases)},
+            'counters': dict(sorted(self.counters.items()))
+        }
+
+    def write_json(self, out):
+        json.dump(self.report(), out, indent=2)
+        out.write("\n")
+
+    def format_report(self):
+        lines = [
+            f"{'phase':<20}{'count':>8}{'total ms':>12}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+        ]
+        for phase, summary in self.report()['phases'].items():
+            lines.append(
+                f"{phase:<20}{summary['count']:>8}{summary['total_ms']:>12.2f}{summary['mean_ms']:>10.4f}"
+                f"{summary['p50_ms']:>10.4f}{summary['p99_ms']:>10.4f}{summary['max_ms']:>10.4f}"
+            )
+        for counter, value in sorted(self.counters.items()):
+            lines.append(f"{counter:<20}{value:>8}")
+        return "\n".join(lines)
+
+
+# Stands in for a profile when nothing is being measured.
+class NullProfile:
+
+    def clock(self):
+        return 0
+
+    def lap(self, phase, start):
+        return 0
+
+    def add(self, phase, seconds):
+        pass
+
+    def count(self, counter, amount=1):
+        pass
+
+
+NULL_PROFILE = NullProfile()
+
+
+def current():
+    return getattr(state, 'profile', None) or NULL_PROFILE
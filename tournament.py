@@ -0,0 +1,204 @@
+import argparse
+import concurrent.futures
+import contextlib
+import csv
+import functools
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import sim
+import simlog
+import timing
+import world
+import worldfile
+
+DEFAULT_TURNS = [100, 300, 1000]
+DEFAULT_PAIR = "aiA:aiB"
+
+# The CSV columns for teams of up to num_agents agents.
+def result_fields(num_agents):
+    names = world.World.AGENT_NAMES[:num_agents]
+    fields = ['world', 'max_turns', 'agents', 'turns']
+    fields += [f"state{name}" for name in names]
+    for name in names:
+        fields += [f"points{name}", f"scored{name}"]
+    return fields + ['total', 'wall_time', 'error']
+
+
+def find_worlds(paths):
+    world_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, name)
+                if os.path.isfile(full_path):
+                    world_files.append(full_path)
+        else:
+            world_files.append(path)
+    return world_files
+
+
+def load_agent_factory(module_name):
+    return importlib.import_module(module_name).AI
+
+
+def make_jobs(world_files, turn_budgets, agent_pairs, use_cache=True, coordinate=False, profile=False):
+    jobs = []
+    for world_filename in world_files:
+        for max_turns in turn_budgets:
+            for pair in agent_pairs:
+                jobs.append((world_filename, max_turns, pair, use_cache, coordinate, profile))
+    return jobs
+
+
+def simulate(job, log):
+    world_filename, max_turns, pair, use_cache, coordinate, profile = job
+    result = {
+        'world': world_filename,
+        'max_turns': max_turns,
+        'agents': pair,
+        'error': None
+    }
+
+    start = time.perf_counter()
+    try:
+        the_world = worldfile.load(world_filename, use_cache)
+        ai_factories = [load_agent_factory(module) for module in pair.split(":")]
+        # The first agent sets up the navigation the team shares.
+        if coordinate:
+            ai_factories[0] = functools.partial(ai_factories[0], coordinate_frontiers=True)
+        if len(ai_factories) != 2:
+            ai_factories[0] = functools.partial(ai_factories[0], num_bots=len(ai_factories))
+        profile = timing.Profile() if profile else None
+        result.update(sim.run_sim(
+            the_world,
+            max_turns,
+            log,
+            profile=profile,
+            ai_factories=ai_factories
+        ))
+        if profile is not None:
+            result['timings'] = profile.report()
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['wall_time'] = time.perf_counter() - start
+    return result
+
+
+def run_job(job):
+    # The agents print their maps every turn. Headless runs throw all of
+    # that away, and do not build a sim log at all.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return simulate(job, simlog.quiet())
+
+
+def run_job_in_thread(job):
+    return simulate(job, simlog.quiet())
+
+
+def run_tournament(jobs, processes=None):
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap(run_job, jobs):
+            yield result
+
+
+def run_tournament_threaded(jobs, threads=None):
+    # Simulations keep all of their state on their own World and
+    # NavigationManager, so they can share one interpreter. stdout is
+    # process-wide, so it is silenced once around the whole pool.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(run_job_in_thread, jobs))
+    yield from results
+
+
+# num_agents is the size of the largest team played, which sets the CSV
+# columns. Phase timings are only written to JSONL.
+def write_results(results, out, fmt, num_agents=2):
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=result_fields(num_agents))
+        writer.writeheader()
+        for result in results:
+            result.pop('timings', None)
+            writer.writerow(result)
+    else:
+        for result in results:
+            out.write(json.dumps(result) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run headless simulations over a set of worlds in parallel."
+    )
+    parser.add_argument(
+        "worlds", nargs="*", default=["worlds"],
+        help="world files or directories of world files (default: worlds)"
+    )
+    parser.add_argument(
+        "-t", "--turns", type=int, nargs="+", default=DEFAULT_TURNS,
+        help="max_turns budgets to run each world at"
+    )
+    parser.add_argument(
+        "-a", "--agents", nargs="+", default=[DEFAULT_PAIR],
+        help="agent teams as moduleA:moduleB, with one module per agent start in the worlds (default: aiA:aiB)"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="number of workers (default: one per core)"
+    )
+    parser.add_argument(
+        "--threads", action="store_true",
+        help="run the simulations on a thread pool in this interpreter instead of a process pool"
+    )
+    parser.add_argument(
+        "--coordinate", action="store_true",
+        help="have the agents split frontiers between them instead of each chasing its nearest one"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="time each phase of every turn and add the percentiles to the JSONL results"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="parse text worlds on every run instead of using compiled copies"
+    )
+    parser.add_argument(
+        "-o", "--output", default=None,
+        help="results file, .csv or .jsonl (default: JSONL on stdout)"
+    )
+    parser.add_argument(
+        "-f", "--format", choices=["csv", "jsonl"], default=None,
+        help="output format (default: taken from the output file extension)"
+    )
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.output and args.output.endswith(".csv") else "jsonl"
+
+    jobs = make_jobs(
+        find_worlds(args.worlds),
+        args.turns,
+        args.agents,
+        not args.no_cache,
+        args.coordinate,
+        args.profile
+    )
+    if args.threads:
+        results = run_tournament_threaded(jobs, args.jobs)
+    else:
+        results = run_tournament(jobs, args.jobs)
+
+    num_agents = max(len(team.split(":")) for team in args.agents)
+    if args.output is None:
+        write_results(results, sys.stdout, fmt, num_agents)
+    else:
+        with open(args.output, 'w', newline='') as out:
+            write_results(results, out, fmt, num_agents)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# Lock-step simulation of many copies of one world, for sweeps that would
+# otherwise call run_sim over and over.
+#
+# VectorEnv holds the state of every copy in flat arrays: the cells of all
+# the copies stacked in one bytearray, and the position, state and points
+# of every agent of every copy side by side. Each step moves one agent, in
+# turn order, in every copy at once: one pass does the moves, the wall
+# checks and the triggers for all of them, and one call to the visibility
+# index works out what the next agent sees in each copy.
+#
+# A turn is one step per agent, so each agent sees the world as the agents
+# before it left it, exactly as in run_sim. A copy played by the same AIs
+# ends with the same result run_sim would give it.
+#
+# Walls never change during a run, as triggers only turn goals into open
+# ground, so the copies share the world's walls, visibility index and
+# portal targets. Only their cells, which goals change, are kept apart.
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+from array import array
+import sim
+import simlog
+import world
+import worldfile
+
+GOOD = 0
+EXITED = 1
+BAD = 2
+STATE_NAMES = ['GOOD', 'EXITED', 'BAD']
+
+USE = 'U'
+
+
+class VectorEnv:
+
+    def __init__(self, the_world, copies, max_turns=None):
+        if copies < 1:
+            raise ValueError(f"A vector of worlds needs at least one copy, not {copies}.")
+        self.world = the_world
+        self.copies = copies
+        self.max_turns = max_turns
+        self.num_agents = len(the_world.get_starts())
+        self.names = world.World.AGENT_NAMES[:self.num_agents]
+        self.points_per_goal = max_turns if max_turns is not None else 0
+
+        width = the_world.get_width()
+        self.size = width * the_world.get_height()
+        self.start_cells = bytes(the_world.grid.cells)
+        self.start_positions = [y * width + x for x, y, facing in the_world.get_starts()]
+        self.wall_codes = world.World.WALL_CODES
+
+        # Each move as the step through the grid it takes, and a check that
+        # it stays inside the grid.
+        size = self.size
+        self.moves = {
+            'N': (-width, lambda index: index >= width),
+            'E': (1, lambda index: index % width + 1 < width),
+            'S': (width, lambda index: index + width < size),
+            'W': (-1, lambda index: index % width > 0)
+        }
+
+        # What using each trigger cell does: where each portal sends an
+        # agent, and which cells each goal turns into open ground.
+        self.exit_code = ord('r')
+        self.portals = {}
+        for portal, target in (('b', 'o'), ('o', 'b'), ('p', 'y'), ('y', 'p')):
+            cell = the_world.find_cell(target)
+            if cell is not None:
+                self.portals[ord(portal)] = the_world.grid.index(*cell)
+        self.goal_cells = {
+            ord(goal): sorted(the_world.cell_index.get(goal, ()))
+            for goal in world.World.GOAL_CELLS
+        }
+        self.open_code = ord('g')
+
+        self.reset()
+
+    # Puts every copy back at the start of a run, and returns what the
+    # first agent sees in each.
+    def reset(self):
+        copies = self.copies
+        num_agents = self.num_agents
+        self.cells = bytearray(self.start_cells * copies)
+        self.positions = array('i', self.start_positions * copies)
+        self.states = bytearray(num_agents * copies)
+        self.points = array('i', [0]) * (num_agents * copies)
+        self.finished = bytearray(copies)
+        self.turns = array('i', [0]) * copies
+        self.turn = 1
+        self.agent = 0
+        self.start_turn()
+        self.seek()
+        return self.observe()
+
+    def start_turn(self):
+        num_agents = self.num_agents
+        states = self.states
+        for k in range(self.copies):
+            if not self.finished[k]:
+                if GOOD in states[k * num_agents:(k + 1) * num_agents]:
+                    self.turns[k] = self.turn
+                else:
+                    self.finished[k] = 1
+
+    # Moves on to the next agent that is still playing in any copy, into
+    # the following turns if need be, and finishes the copies that run out
+    # of turns or agents on the way.
+    def seek(self):
+        num_agents = self.num_agents
+        states = self.states
+        finished = self.finished
+        while True:
+            while self.agent < num_agents:
+                for k in range(self.copies):
+                    if not finished[k] and states[k * num_agents + self.agent] == GOOD:
+                        return
+                self.agent += 1
+            if self.max_turns is not None and self.turn >= self.max_turns:
+                finished[:] = b'\x01' * self.copies
+            if all(finished):
+                return
+            self.turn += 1
+            self.agent = 0
+            self.start_turn()
+
+    def done(self):
+        return all(self.finished)
+
+    # Whether the current agent takes a step in each copy.
+    def acting(self):
+        num_agents = self.num_agents
+        agent = self.agent
+        states = self.states
+        return [
+            not self.finished[k] and states[k * num_agents + agent] == GOOD
+            for k in range(self.copies)
+        ]
+
+    # What the current agent sees in each copy, as World.views gives it,
+    # or None in the copies it takes no step in.
+    def observe(self):
+        result = [None] * self.copies
+        if self.done():
+            return result
+        num_agents = self.num_agents
+        acting = [k for k, active in enumerate(self.acting()) if active]
+        views = self.world.visibility.views(
+            [self.positions[k * num_agents + self.agent] for k in acting],
+            self.cells,
+            [k * self.size for k in acting]
+        )
+        for k, view in zip(acting, views):
+            result[k] = view
+        return result
+
+    # Carries out the current agent's command in every copy, given one
+    # command per copy; those for copies it takes no step in are ignored.
+    # Returns what the next agent sees in each copy, the points the agent
+    # was given in each, and whether each copy has finished.
+    def step(self, commands):
+        if self.done():
+            raise ValueError("Every copy has finished; reset before stepping again.")
+        num_agents = self.num_agents
+        size = self.size
+        cells = self.cells
+        positions = self.positions
+        states = self.states
+        points = self.points
+        moves = self.moves
+        wall_codes = self.wall_codes
+        portals = self.portals
+        rewards = array('i', [0]) * self.copies
+
+        for k, active in enumerate(self.acting()):
+            if not active:
+                continue
+            slot = k * num_agents + self.agent
+            cmd = commands[k]
+            gained = 1
+            if not sim.validate_agent_cmd(cmd):
+                states[slot] = BAD
+            elif cmd == USE:
+                base = k * size
+                index = positions[slot]
+                code = cells[base + index]
+                if code == self.exit_code:
+                    states[slot] = EXITED
+                elif code in portals:
+                    positions[slot] = portals[code]
+                elif code in self.goal_cells:
+                    for cell in self.goal_cells[code]:
+                        cells[base + cell] = self.open_code
+                    gained += self.points_per_goal
+            else:
+                step, inside = moves[cmd]
+                index = positions[slot]
+                if inside(index) and cells[k * size + index + step] not in wall_codes:
+                    positions[slot] = index + step
+            points[slot] += gained
+            rewards[k] = gained
+
+        self.agent += 1
+        self.seek()
+        return self.observe(), rewards, [bool(done) for done in self.finished]
+
+    # What run_sim would return for each copy.
+    def results(self):
+        num_agents = self.num_agents
+        results = []
+        for k in range(self.copies):
+            states = self.states[k * num_agents:(k + 1) * num_agents]
+            points = self.points[k * num_agents:(k + 1) * num_agents]
+            scored = [points[i] if states[i] == EXITED else 0 for i in range(num_agents)]
+            result = {'turns': self.turns[k]}
+            result.update({f"state{name}": STATE_NAMES[states[i]] for i, name in enumerate(self.names)})
+            result.update({f"points{name}": points[i] for i, name in enumerate(self.names)})
+            result.update({f"scored{name}": scored[i] for i, name in enumerate(self.names)})
+            result['total'] = sum(scored)
+            results.append(result)
+        return results
+
+
+# Plays copies of a world in lock-step, each with its own team of AIs,
+# and returns what run_sim would return for each. ai_factories are as for
+# run_sim.
+def run(the_world, copies, max_turns=None, ai_factories=None):
+    ai_factories = sim.players(the_world, ai_factories)
+    env = VectorEnv(the_world, copies, max_turns)
+    teams = [[factory(max_turns) for factory in ai_factories] for k in range(copies)]
+    # The message each agent sent on its last turn, per copy.
+    messages = [[None] * env.num_agents for k in range(copies)]
+
+    views = env.reset()
+    while not env.done():
+        agent = env.agent
+        commands = [None] * copies
+        for k, view in enumerate(views):
+            if view is not None:
+                sent = messages[k]
+                commands[k], sent[agent] = teams[k][agent].update(sim.percepts_from_view(view), sent[agent - 1])
+        views, rewards, finished = env.step(commands)
+    return env.results()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many copies of a world in lock-step.")
+    parser.add_argument("-w", "--world", required=True, help="world file, text or compiled")
+    parser.add_argument("-k", "--copies", type=int, default=16, help="number of copies to play")
+    parser.add_argument("-t", "--turns", type=int, default=None, help="max turns of each run")
+    parser.add_argument(
+        "--compare", action="store_true",
+        help="also play each copy with run_sim, check that the results match and compare the times"
+    )
+    args = parser.parse_args(argv)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        results = run(worldfile.load(args.world), args.copies, args.turns)
+        elapsed = time.perf_counter() - start
+        if args.compare:
+            start = time.perf_counter()
+            expected = [
+                sim.run_sim(worldfile.load(args.world), args.turns, simlog.quiet())
+                for k in range(args.copies)
+            ]
+            sim_elapsed = time.perf_counter() - start
+
+    totals = [result['total'] for result in results]
+    print(f"{args.copies} copies in {elapsed:.3f}s, total {min(totals)} to {max(totals)}")
+    if args.compare:
+        print(f"run_sim: {sim_elapsed:.3f}s, {sim_elapsed / elapsed:.2f}x the time")
+        if results != expected:
+            print("Results differ from run_sim.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
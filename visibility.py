@@ -0,0 +1,166 @@
+# Precomputed line of sight for every cell of a grid.
+#
+# An agent sees in each cardinal direction up to and including the first
+# wall, or up to the edge of the map. For every cell the index stores how
+# many cells that is in each direction, so a percept is a single slice of
+# the grid instead of a raycast.
+
+import itertools
+from array import array
+
+
+def typecode_for(width, height):
+    return 'H' if max(width, height) < 2**16 else 'I'
+
+
+class VisibilityIndex:
+
+    # arrays, when given, are previously computed (north, east, south, west)
+    # distances for this grid, e.g. from a compiled world file. They can be
+    # arrays or writable memoryviews of the same typecode.
+    def __init__(self, the_grid, wall_codes, arrays=None):
+        self.grid = the_grid
+        self.wall_codes = bytes(wall_codes)
+        self.mask_table = bytes(1 if code in self.wall_codes else 0 for code in range(256))
+
+        size = the_grid.width * the_grid.height
+        self.typecode = typecode_for(the_grid.width, the_grid.height)
+        # 0, 1, 2, ... sliced to build runs of distances.
+        self.counting = array(self.typecode, range(max(the_grid.width, the_grid.height) + 1))
+
+        if arrays is not None:
+            for distances in arrays:
+                if memoryview(distances).format != self.typecode or len(distances) != size:
+                    raise ValueError("Visibility arrays do not match the grid.")
+            self.north, self.east, self.south, self.west = arrays
+        else:
+            itemsize = array(self.typecode).itemsize
+            self.north = array(self.typecode, bytes(size * itemsize))
+            self.east = array(self.typecode, bytes(size * itemsize))
+            self.south = array(self.typecode, bytes(size * itemsize))
+            self.west = array(self.typecode, bytes(size * itemsize))
+            self.rebuild()
+
+    def arrays(self):
+        return (self.north, self.east, self.south, self.west)
+
+    def rebuild(self):
+        for y in range(self.grid.height):
+            self.update_row(y)
+        for x in range(self.grid.width):
+            self.update_column(x)
+
+    # Refreshes the index after the cell at x, y changed between wall and
+    # not wall.
+    def update(self, x, y):
+        self.update_row(y)
+        self.update_column(x)
+
+    def update_row(self, y):
+        width = self.grid.width
+        start = y * width
+        forward, backward = self.reach(self.grid.cells[start:start + width])
+        self.east[start:start + width] = forward
+        self.west[start:start + width] = backward
+
+    def update_column(self, x):
+        width = self.grid.width
+        forward, backward = self.reach(self.grid.cells[x::width])
+        self.south[x::width] = forward
+        self.north[x::width] = backward
+
+    # Distances along one row or column. forward[i] counts the cells seen
+    # looking towards higher indices from i, backward[i] towards lower ones.
+    def reach(self, line):
+        mask = line.translate(self.mask_table)
+        length = len(mask)
+        counting = self.counting
+        forward = array(self.typecode)
+        backward = array(self.typecode)
+
+        previous = -1
+        wall = mask.find(1)
+        while wall != -1:
+            # Cells from the previous wall up to this one see forward to it.
+            forward += counting[wall - max(previous, 0):0:-1]
+            # Cells after the previous wall up to this one see back to it.
+            if previous == -1:
+                backward += counting[0:wall + 1]
+            else:
+                backward += counting[1:wall - previous + 1]
+            previous = wall
+            wall = mask.find(1, wall + 1)
+
+        # Past the last wall the rays run to the edge.
+        if previous == -1:
+            forward += counting[length - 1::-1]
+            backward += counting[0:length]
+        else:
+            forward += counting[length - 1 - previous::-1]
+            backward += counting[1:length - previous]
+        return forward, backward
+
+    # The cells seen from x, y in a direction, nearest first, as cell codes.
+    def ray(self, x, y, direction):
+        width = self.grid.width
+        cells = self.grid.cells
+        index = y * width + x
+        match direction:
+            case 'N':
+                count = self.north[index]
+                if count == 0:
+                    return cells[0:0]
+                stop = index - (count + 1) * width
+                return cells[index - width:stop if stop >= 0 else None:-width]
+            case 'E':
+                return cells[index + 1:index + 1 + self.east[index]]
+            case 'S':
+                return cells[index + width:index + (self.south[index] + 1) * width:width]
+            case 'W':
+                count = self.west[index]
+                if count == 0:
+                    return cells[0:0]
+                stop = index - 1 - count
+                return cells[index - 1:stop if stop >= 0 else None:-1]
+
+    # Everything seen from each of a batch of cells, given as grid indices:
+    # the cell itself, then its north, east, south and west rays, each as
+    # cell codes, nearest first. The same as ray() in every direction, in
+    # one pass over the batch.
+    # cells and offsets read the codes from copies of the grid stacked in
+    # one buffer instead, each index being read at its offset into cells.
+    # Copies can differ in their cells, but not in where their walls are.
+    def views(self, indices, cells=None, offsets=None):
+        width = self.grid.width
+        if cells is None:
+            cells = self.grid.cells
+        if offsets is None:
+            offsets = itertools.repeat(0)
+        north = self.north
+        east = self.east
+        south = self.south
+        west = self.west
+        empty = cells[0:0]
+        result = []
+        for index, offset in zip(indices, offsets):
+            at = offset + index
+            count = north[index]
+            if count == 0:
+                seen_north = empty
+            else:
+                stop = at - (count + 1) * width
+                seen_north = cells[at - width:stop if stop >= 0 else None:-width]
+            count = west[index]
+            if count == 0:
+                seen_west = empty
+            else:
+                stop = at - 1 - count
+                seen_west = cells[at - 1:stop if stop >= 0 else None:-1]
+            result.append((
+                cells[at:at + 1],
+                seen_north,
+                cells[at + 1:at + 1 + east[index]],
+                cells[at + width:at + (south[index] + 1) * width:width],
+                seen_west
+            ))
+        return result
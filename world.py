@@ -1,4 +1,8 @@
+import collections
+import string
 import misc
+import grid
+import visibility
 
 class World:
 
@@ -12,97 +16,154 @@ class World:
 
     # Cells that are treated as walls.
     WALL_CELLS = ['w']
+    WALL_CODES = ''.join(WALL_CELLS).encode('ascii')
 
     # Goal Cells
     GOAL_CELLS = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
 
+    # Cells whose positions are indexed. Everything but open ground and
+    # walls, which make up nearly the whole map.
+    INDEXED_CELLS = [
+        'b', 'o', 'r', 'p', 'y', '1',
+        '2', '3', '4', '5', '6', '7',
+        '8', '9', '0'
+    ]
+
     DIRECTIONS = ['N', 'E', 'S', 'W']
 
+    # Agents are named in the order they take their turns.
+    AGENT_NAMES = string.ascii_uppercase
+
+    # The valid cells as raw cell codes, for validating whole rows at once.
+    VALID_CODES = ''.join(VALID_CELLS).encode('ascii')
+
     def __init__(self, world_filename):
         self.world_filename = world_filename
-        self.start_xA = None
-        self.start_yA = None
-        self.start_xB = None
-        self.start_yB = None
-        self.face_dirA = None
-        self.face_dirB = None
+        self.starts = [] # (x, y, facing) of every agent, in turn order.
         self.width = 0
         self.height = 0
-        self.world_map = []
+        self.grid = grid.Grid(0, 0)
+        self.visibility = None
+        self.cell_index = {}
         self.doors_closed = True
-        self.goals = []
+        self.goals = collections.Counter()
 
     def load_world(self):
         try:
             with open(self.world_filename, 'r') as f:
 
-                # Parse agent starting location
+                # Parse the agents' starting locations. The first line holds
+                # x y for every agent, and the second each agent's facing.
                 startxy = f.readline().strip().split()
                 facedir = f.readline().strip().split()
                 
-                if len(startxy) != 4:
+                if not startxy or len(startxy) % 2 != 0:
                     raise misc.InvalidWorldException(
                         f"World {self.world_filename} is missing the xy agent start."
                     )
+                num_agents = len(startxy) // 2
+                if num_agents > len(World.AGENT_NAMES):
+                    raise misc.InvalidWorldException(
+                        f"World {self.world_filename} has {num_agents} agents, at most {len(World.AGENT_NAMES)} are supported."
+                    )
 
-                try:
-                    if facedir[0] in World.DIRECTIONS:
-                        self.face_dirA = facedir[0]
-                    else:
-                        raise Exception
-                    if facedir[1] in World.DIRECTIONS:
-                        self.face_dirB = facedir[1]
-                    else:
-                        raise Exception
-                except Exception:
+                if len(facedir) != num_agents or any(facing not in World.DIRECTIONS for facing in facedir):
                     raise misc.InvalidWorldException(
                         f"World {self.world_filename} has an invalid starting facing."
                     )
 
                 try:
-                    self.start_xA = int(startxy[0])
-                    self.start_yA = int(startxy[1])
-                    self.start_xB = int(startxy[2])
-                    self.start_yB = int(startxy[3])
+                    self.starts = [
+                        (int(startxy[i * 2]), int(startxy[i * 2 + 1]), facedir[i])
+                        for i in range(num_agents)
+                    ]
                 except Exception:
+                    cells = " ".join(
+                        f"{World.AGENT_NAMES[i]}: {startxy[i * 2]} {startxy[i * 2 + 1]}"
+                        for i in range(num_agents)
+                    )
                     raise misc.InvalidWorldException(
-                        f"Invalid agent starting cells: A: {startxy[0]} {startxy[1]} B: {startxy[2]} {startxy[3]}"
+                        f"Invalid agent starting cells: {cells}"
                     )
 
                 # Parse the world
+                width = 0
+                height = 0
+                cells = bytearray()
                 for line in f:
                     line = line.split()
-                    row = []
-                    for element in line:
-                        if element not in World.VALID_CELLS:
-                            raise misc.InvalidCellException(
-                                f"{element} is not a valid cell type."
-                            )
-                        row.append(element)
-                    self.world_map.append(row)
+                    if not line:
+                        continue
+                    row = ''.join(line).encode('ascii', 'replace')
+                    # A row is valid when every element is a single valid
+                    # cell character, i.e. nothing is left once the valid
+                    # codes are deleted.
+                    if len(row) != len(line) or row.translate(None, World.VALID_CODES):
+                        for element in line:
+                            if element not in World.VALID_CELLS:
+                                raise misc.InvalidCellException(
+                                    f"{element} is not a valid cell type."
+                                )
+                    if height == 0:
+                        width = len(line)
+                    elif len(line) != width:
+                        raise misc.InvalidWorldException(
+                            f"World {self.world_filename} row {height} has {len(line)} cells, expected {width}."
+                        )
+                    cells += row
+                    height += 1
 
-                self.height = len(self.world_map)
-                self.width = len(self.world_map[0])
-
-                # Find all the goals
-                self.find_goals()
+                self.set_map(width, height, cells)
 
         except FileNotFoundError:
             print(f"{self.world_filename} was not found.")
 
+    # Installs a parsed map and builds everything derived from it. The
+    # visibility index can be passed in when it was loaded precomputed.
+    def set_map(self, width, height, cells, visibility_arrays=None):
+        self.width = width
+        self.height = height
+        self.grid = grid.Grid(width, height, cells)
+        self.visibility = visibility.VisibilityIndex(
+            self.grid,
+            World.WALL_CODES,
+            visibility_arrays
+        )
+        self.build_cell_index()
+
+        # Find all the goals
+        self.find_goals()
+
+    @property
+    def world_map(self):
+        return [list(row) for row in self.grid.rows()]
+
     def prettyprint_world(self):
-        for row in self.world_map:
+        for row in self.grid.rows():
             for ele in row:
                 print(f"{ele} ",end="")
             print()
 
 
+    # Positions of every indexed cell type, as grid indices.
+    def build_cell_index(self):
+        cells = self.grid.cells
+        self.cell_index = {}
+        for flag in World.INDEXED_CELLS:
+            code = grid.cell_code(flag)
+            positions = set()
+            index = cells.find(code)
+            while index != -1:
+                positions.add(index)
+                index = cells.find(code, index + 1)
+            self.cell_index[flag] = positions
+
     def find_goals(self):
-        for row in self.world_map:
-            for ele in row:
-                if ele in World.GOAL_CELLS:
-                    self.goals.append(ele)
-        self.goals.sort()
+        self.goals = collections.Counter()
+        for goal in World.GOAL_CELLS:
+            count = len(self.cell_index.get(goal, ()))
+            if count:
+                self.goals[goal] = count
 
     def get_width(self):
         return self.width
@@ -110,30 +171,47 @@ class World:
     def get_height(self):
         return self.height
 
+    def get_starts(self):
+        return self.starts
+
     def get_startxyA(self):
-        return (self.start_xA, self.start_yA)
+        return self.starts[0][:2]
 
     def get_startxyB(self):
-        return (self.start_xB, self.start_yB)
+        return self.starts[1][:2]
     
     def get_start_face_dirA(self):
-        return self.face_dirA
+        return self.starts[0][2]
 
     def get_start_face_dirB(self):
-        return self.face_dirB
+        return self.starts[1][2]
 
     def get_cell(self, x, y):
-        return self.world_map[y][x]
+        return self.grid.get(x, y)
     
     def set_cell(self, x, y, flag):
-        self.world_map[y][x] = flag
+        old_flag = self.get_cell(x, y)
+        was_wall = old_flag in World.WALL_CELLS
+        self.grid.set(x, y, flag)
+        index = self.grid.index(x, y)
+        if old_flag in self.cell_index:
+            self.cell_index[old_flag].discard(index)
+        if flag in self.cell_index:
+            self.cell_index[flag].add(index)
+        if self.visibility is not None and was_wall != (flag in World.WALL_CELLS):
+            self.visibility.update(x, y)
 
     def is_valid_cell(self, x, y):
-        try:
-            self.world_map[y][x]
-            return True
-        except IndexError:
-            return False
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get_row(self, y):
+        return self.grid.row(y)
+
+    def get_column(self, x):
+        return self.grid.column(x)
+
+    def get_rect(self, x, y, width, height):
+        return self.grid.rect(x, y, width, height)
 
     def is_cell_enterable(self, x, y):
         if self.is_valid_cell(x, y):
@@ -155,7 +233,31 @@ class World:
         cells['X'] = self.get_cell(x, y)
         return cells
 
+    # What an agent at x, y sees in a direction: every cell up to and
+    # including the first wall, nearest first. Same as a pruned raycast.
+    def look(self, x, y, direction):
+        self.grid.check_bounds(x, y)
+        return self.visibility.ray(x, y, direction).decode('ascii')
+
+    # What agents at each of xs[i], ys[i] see, worked out together. Each
+    # agent's view is (cell, north, east, south, west) as cell codes, with
+    # the rays nearest first, as look() gives them.
+    def views(self, xs, ys):
+        width = self.width
+        indices = []
+        for x, y in zip(xs, ys):
+            self.grid.check_bounds(x, y)
+            indices.append(y * width + x)
+        return self.visibility.views(indices)
+
     def raycast(self, x, y, dx, dy):
+        # Straight rays are read as a slice of the row or column.
+        if self.is_valid_cell(x, y):
+            match (dx, dy):
+                case (0, -1): return list(self.get_column(x)[y-1::-1]) if y > 0 else []
+                case (1, 0): return list(self.get_row(y)[x+1:])
+                case (0, 1): return list(self.get_column(x)[y+1:])
+                case (-1, 0): return list(self.get_row(y)[x-1::-1]) if x > 0 else []
         cells = []
         nx = x+dx
         ny = y+dy
@@ -172,19 +274,34 @@ class World:
         return cells[:i+1]
 
     def find_cell(self, flag):
-        for y in range(len(self.world_map)):
-            for x in range(len(self.world_map[y])):
-                cell = self.get_cell(x, y)
-                if cell == flag:
-                    return (x, y)
-        return None
+        if flag in self.cell_index:
+            positions = self.cell_index[flag]
+            if not positions:
+                return None
+            # The first match in reading order, as a full scan would find.
+            return self.grid.coords(min(positions))
+        index = self.grid.cells.find(grid.cell_code(flag))
+        if index == -1:
+            return None
+        return self.grid.coords(index)
 
     def swap_all_cells(self, flagA, flagB):
-        for y in range(len(self.world_map)):
-            for x in range(len(self.world_map[y])):
-                cell = self.get_cell(x, y)
-                if cell == flagA:
-                    self.set_cell(x, y, flagB)
+        if flagA in self.cell_index:
+            for index in sorted(self.cell_index[flagA]):
+                self.set_cell(*self.grid.coords(index), flagB)
+            return
+        codeA = grid.cell_code(flagA)
+        codeB = grid.cell_code(flagB)
+        walls_changed = (flagA in World.WALL_CELLS) != (flagB in World.WALL_CELLS)
+        cells = self.grid.cells
+        index = cells.find(codeA)
+        while index != -1:
+            cells[index] = codeB
+            if walls_changed and self.visibility is not None:
+                self.visibility.update(*self.grid.coords(index))
+            if flagB in self.cell_index:
+                self.cell_index[flagB].add(index)
+            index = cells.find(codeA, index + 1)
 
     def check_triggers(self, x, y, cmd):
         if self.is_valid_cell(x, y):
@@ -215,9 +332,10 @@ class World:
             #         self.swap_all_cells("y", "g")
             #         return ["DOORS_OPEN"]
             elif cell in World.GOAL_CELLS and cmd == "U":
-                index = self.goals.index(cell)
                 self.swap_all_cells(cell, "g")
-                del self.goals[index]
-                return ["GOAL_TRIGGERED", len(self.goals), cell]
+                self.goals[cell] -= 1
+                if self.goals[cell] <= 0:
+                    del self.goals[cell]
+                return ["GOAL_TRIGGERED", self.goals.total(), cell]
                 
         return ["NONE"]
@@ -0,0 +1,230 @@
+# Compiled binary world files.
+#
+# A compiled world holds everything World.load_world would work out from a
+# text world, ready to use:
+#
+#   header       magic, format version, byte order, agent count, width, height
+#   agents       start x, start y and facing for each agent
+#   grid         width*height cell codes, row-major
+#   visibility   north, east, south and west sight distances per cell
+#
+# Text worlds are compiled once into a cache directory next to them, keyed by
+# a hash of their contents, and loaded from there with mmap afterwards.
+
+import argparse
+import contextlib
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+import misc
+import visibility
+import world
+
+MAGIC = b'MWB\x00'
+FORMAT_VERSION = 1
+CACHE_DIR_NAME = "__worldcache__"
+EXTENSION = ".mwb"
+
+HEADER = struct.Struct('<4sHBBII')
+AGENT = struct.Struct('<iic')
+BYTE_ORDERS = {'little': 0, 'big': 1}
+
+
+# Flags for creating a new file to write, which must not exist already.
+NEW_FILE_FLAGS = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+
+
+# Creates a uniquely named temporary file in a directory, and returns its
+# descriptor and name. Unlike mkstemp, which makes files that only their
+# owner can read, it leaves the permissions to the umask, as open() does.
+def create_temporary(directory, suffix):
+    while True:
+        filename = os.path.join(directory, f".tmp{os.getpid()}-{os.urandom(6).hex()}{suffix}")
+        try:
+            return os.open(filename, NEW_FILE_FLAGS, 0o666), filename
+        except FileExistsError:
+            continue
+
+
+# Opens a temporary file next to filename to write to, and moves it into
+# place once the block finishes, so that concurrent readers never see a
+# half-written file.
+@contextlib.contextmanager
+def atomic_write(filename, mode='wb', suffix=''):
+    fd, tmp_filename = create_temporary(os.path.dirname(os.path.abspath(filename)), suffix)
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.unlink(tmp_filename)
+        raise
+
+
+def is_compiled(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def agent_starts(the_world):
+    return the_world.get_starts()
+
+
+def write_compiled(the_world, out_filename):
+    starts = agent_starts(the_world)
+    with atomic_write(out_filename, suffix=EXTENSION) as f:
+        f.write(HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            BYTE_ORDERS[sys.byteorder],
+            len(starts),
+            the_world.width,
+            the_world.height
+        ))
+        for x, y, facing in starts:
+            f.write(AGENT.pack(x, y, facing.encode('ascii')))
+        f.write(the_world.grid.cells)
+        for distances in the_world.visibility.arrays():
+            f.write(distances)
+
+
+# Writes a world in the text format World.load_world reads.
+def write_text(the_world, out_filename):
+    starts = agent_starts(the_world)
+    with atomic_write(out_filename, 'w') as f:
+        f.write(" ".join(f"{x} {y}" for x, y, facing in starts) + "\n")
+        f.write(" ".join(facing for x, y, facing in starts) + "\n")
+        for y in range(the_world.height):
+            f.write(" ".join(the_world.get_row(y)) + "\n")
+
+
+def load_compiled(filename, world_filename=None):
+    the_world = world.World(world_filename or filename)
+    with open(filename, 'rb') as f:
+        # Checked before mapping, as an empty file cannot be mapped.
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise misc.InvalidWorldException(f"{filename} is not a compiled world.")
+        # Mapped copy-on-write, so that the visibility arrays can stay views
+        # over the mapping: only the pages that are read get loaded, and a
+        # wall changing during a run writes to a private copy of its page,
+        # never to the file.
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    try:
+        magic, version, byte_order, num_agents, width, height = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise misc.InvalidWorldException(f"{filename} is not a compiled world.")
+        if version != FORMAT_VERSION:
+            raise misc.InvalidWorldException(
+                f"{filename} is compiled world version {version}, expected {FORMAT_VERSION}."
+            )
+
+        offset = HEADER.size
+        if len(data) < offset + num_agents * AGENT.size:
+            raise misc.InvalidWorldException(f"{filename} is truncated.")
+        starts = []
+        for i in range(num_agents):
+            x, y, facing = AGENT.unpack_from(data, offset)
+            starts.append((x, y, facing.decode('ascii')))
+            offset += AGENT.size
+        the_world.starts = starts
+
+        size = width * height
+        typecode = visibility.typecode_for(width, height)
+        itemsize = array(typecode).itemsize
+        if len(data) != offset + size + 4 * size * itemsize:
+            raise misc.InvalidWorldException(f"{filename} is truncated.")
+
+        # The grid is copied out of the mapping because the grid needs a
+        # bytearray, and triggers change cells during a run.
+        cells = bytearray(data[offset:offset + size])
+        offset += size
+
+        arrays = []
+        if byte_order == BYTE_ORDERS[sys.byteorder]:
+            mapped = memoryview(data)
+            for i in range(4):
+                arrays.append(mapped[offset:offset + size * itemsize].cast(typecode))
+                offset += size * itemsize
+        else:
+            # Written on a machine of the other byte order, so the arrays
+            # have to be copied to be swapped.
+            for i in range(4):
+                distances = array(typecode)
+                distances.frombytes(data[offset:offset + size * itemsize])
+                distances.byteswap()
+                arrays.append(distances)
+                offset += size * itemsize
+            data.close()
+    except BaseException:
+        data.close()
+        raise
+
+    the_world.set_map(width, height, cells, arrays)
+    return the_world
+
+
+def cache_filename(world_filename, contents):
+    digest = hashlib.sha256(contents).hexdigest()
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(world_filename)), CACHE_DIR_NAME)
+    return os.path.join(cache_dir, f"{digest}.v{FORMAT_VERSION}{EXTENSION}")
+
+
+# Loads a text or compiled world. Text worlds are compiled into the cache
+# on first use when use_cache is set.
+def load(world_filename, use_cache=True):
+    # Only the magic is read to tell a compiled world from a text one, as a
+    # compiled world is mapped rather than read.
+    if is_compiled(world_filename):
+        return load_compiled(world_filename)
+    with open(world_filename, 'rb') as f:
+        contents = f.read()
+
+    if use_cache:
+        cached = cache_filename(world_filename, contents)
+        if os.path.exists(cached):
+            try:
+                return load_compiled(cached, world_filename)
+            except misc.InvalidWorldException:
+                # Left behind by an older version or an interrupted write.
+                # It is treated as a miss, and rebuilt below.
+                try:
+                    os.unlink(cached)
+                except OSError:
+                    pass
+
+    the_world = world.World(world_filename)
+    the_world.load_world()
+
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            write_compiled(the_world, cached)
+        except OSError:
+            # The cache is only an optimization; read-only trees still load.
+            pass
+    return the_world
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile text worlds to the binary world format.")
+    parser.add_argument("worlds", nargs="+", help="text world files")
+    parser.add_argument(
+        "-o", "--output", default=None,
+        help=f"output file when compiling a single world (default: the world file with {EXTENSION} appended)"
+    )
+    args = parser.parse_args(argv)
+
+    if args.output is not None and len(args.worlds) != 1:
+        parser.error("-o can only be used with a single world")
+
+    for world_filename in args.worlds:
+        the_world = world.World(world_filename)
+        the_world.load_world()
+        write_compiled(the_world, args.output or world_filename + EXTENSION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+# Seeded generator for large worlds.
+#
+# A generated world is split into up to three regions side by side, with a
+# solid wall between each. No region can be walked to from another; the
+# first is linked to the second by the b/o portals and the second to the
+# third by the p/y portals. Inside a region the layout is one of:
+#
+#   maze   a perfect maze, carved by a depth first walk
+#   rooms  a grid of rooms, joined by doors along a random spanning tree
+#          of the rooms plus a few extra doors for loops
+#   open   no walls at all
+#
+# Every layout leaves all the open cells of a region connected, so every
+# goal and the exit can be reached from the agents' start in the first
+# region. The exit is put in the last region, so that the portals have to
+# be used to leave.
+
+import argparse
+import random
+import world
+import worldfile
+
+LAYOUTS = ['maze', 'rooms', 'open']
+
+# The portals linking each region to the next.
+PORTALS = [('b', 'o'), ('p', 'y')]
+MAX_REGIONS = len(PORTALS) + 1
+
+# Range of room sizes, walls included, in the rooms layout.
+ROOM_SIZE = (6, 14)
+# Chance of a door between two rooms that the spanning tree did not join.
+EXTRA_DOOR_CHANCE = 0.15
+
+WALL = ord('w')
+FLOOR = ord('g')
+
+
+class Region:
+
+    # x, y, width and height of the open interior, inside the walls.
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        # Open cells nothing has been put on yet.
+        self.floor = 0
+
+
+# Splits the inside of the outer wall into columns, one per region.
+def split_regions(width, height, regions):
+    inner_width = width - 2 - (regions - 1)
+    x = 1
+    result = []
+    for i in range(regions):
+        region_width = inner_width // regions
+        if i == regions - 1:
+            region_width = inner_width - (regions - 1) * (inner_width // regions)
+        result.append(Region(x, 1, region_width, height - 2))
+        x += region_width + 1
+    return result
+
+
+def fill(cells, width, region, code):
+    row = bytes([code]) * region.width
+    for y in range(region.y, region.y + region.height):
+        start = y * width + region.x
+        cells[start:start + region.width] = row
+
+
+# A perfect maze over the cells at even offsets into the region, with the
+# cells between them opened where the walk passes.
+def carve_maze(cells, width, region, rng):
+    maze_width = (region.width + 1) // 2
+    maze_height = (region.height + 1) // 2
+    visited = bytearray(maze_width * maze_height)
+    random = rng.random
+
+    def cell_index(m):
+        return (region.y + m // maze_width * 2) * width + region.x + m % maze_width * 2
+
+    start = rng.randrange(maze_width * maze_height)
+    visited[start] = 1
+    cells[cell_index(start)] = FLOOR
+    stack = [start]
+    while stack:
+        current = stack[-1]
+        mx = current % maze_width
+        choices = []
+        if current >= maze_width and not visited[current - maze_width]:
+            choices.append(current - maze_width)
+        if current + maze_width < len(visited) and not visited[current + maze_width]:
+            choices.append(current + maze_width)
+        if mx > 0 and not visited[current - 1]:
+            choices.append(current - 1)
+        if mx + 1 < maze_width and not visited[current + 1]:
+            choices.append(current + 1)
+        if not choices:
+            stack.pop()
+            continue
+        other = choices[int(random() * len(choices))]
+        visited[other] = 1
+        index = cell_index(current)
+        other_index = cell_index(other)
+        cells[(index + other_index) // 2] = FLOOR
+        cells[other_index] = FLOOR
+        stack.append(other)
+
+
+# Where the walls between rooms go along one side of a region, as offsets
+# into it.
+def room_walls(length, rng):
+    walls = []
+    position = rng.randint(*ROOM_SIZE)
+    while position < length - ROOM_SIZE[0] // 2:
+        walls.append(position)
+        position += rng.randint(*ROOM_SIZE)
+    return walls
+
+
+# The open spans between the walls along one side of a region, as
+# (first, last) offsets into it.
+def spans(length, walls):
+    starts = [0] + [wall + 1 for wall in walls]
+    ends = [wall - 1 for wall in walls] + [length - 1]
+    return list(zip(starts, ends))
+
+
+def carve_rooms(cells, width, region, rng):
+    fill(cells, width, region, FLOOR)
+    columns = room_walls(region.width, rng)
+    rows = room_walls(region.height, rng)
+    for x in columns:
+        for y in range(region.height):
+            cells[(region.y + y) * width + region.x + x] = WALL
+    wall_row = bytes([WALL]) * region.width
+    for y in rows:
+        start = (region.y + y) * width + region.x
+        cells[start:start + region.width] = wall_row
+
+    column_spans = spans(region.width, columns)
+    row_spans = spans(region.height, rows)
+    rooms_wide = len(column_spans)
+    rooms_high = len(row_spans)
+
+    # The door between two neighbouring rooms is in the wall between them,
+    # away from the corners where walls cross.
+    def add_door(room, other):
+        rx, ry = room % rooms_wide, room // rooms_wide
+        ox, oy = other % rooms_wide, other // rooms_wide
+        if ry == oy:
+            x = columns[min(rx, ox)]
+            y = rng.randint(*row_spans[ry])
+        else:
+            x = rng.randint(*column_spans[rx])
+            y = rows[min(ry, oy)]
+        cells[(region.y + y) * width + region.x + x] = FLOOR
+
+    # A random depth first walk over the rooms gives the spanning tree.
+    joined = bytearray(rooms_wide * rooms_high)
+    doors = set()
+    start = rng.randrange(rooms_wide * rooms_high)
+    joined[start] = 1
+    stack = [start]
+    while stack:
+        room = stack[-1]
+        rx, ry = room % rooms_wide, room // rooms_wide
+        choices = [
+            ny * rooms_wide + nx
+            for nx, ny in ((rx, ry - 1), (rx + 1, ry), (rx, ry + 1), (rx - 1, ry))
+            if 0 <= nx < rooms_wide and 0 <= ny < rooms_high and not joined[ny * rooms_wide + nx]
+        ]
+        if not choices:
+            stack.pop()
+            continue
+        other = rng.choice(choices)
+        joined[other] = 1
+        doors.add((min(room, other), max(room, other)))
+        add_door(room, other)
+        stack.append(other)
+
+    for room in range(rooms_wide * rooms_high):
+        rx, ry = room % rooms_wide, room // rooms_wide
+        for other in (room + 1 if rx + 1 < rooms_wide else None, room + rooms_wide if ry + 1 < rooms_high else None):
+            if other is not None and (room, other) not in doors and rng.random() < EXTRA_DOOR_CHANCE:
+                add_door(room, other)
+
+
+def count_floor(cells, width, region):
+    return sum(
+        cells[y * width + region.x:y * width + region.x + region.width].count(FLOOR)
+        for y in range(region.y, region.y + region.height)
+    )
+
+
+# A random open cell of a region that nothing has been put on yet.
+def free_cell(cells, width, region, rng):
+    while True:
+        x = region.x + rng.randrange(region.width)
+        y = region.y + rng.randrange(region.height)
+        if cells[y * width + x] == FLOOR:
+            return x, y
+
+
+def place(cells, width, region, flag, rng):
+    if region.floor == 0:
+        raise ValueError("The world is too small for everything that has to be placed in it.")
+    x, y = free_cell(cells, width, region, rng)
+    cells[y * width + x] = ord(flag)
+    region.floor -= 1
+
+
+# Builds a world of width by height cells, outer wall included. The same
+# arguments and seed always give the same world.
+def generate(width, height, layout='maze', regions=1, goals=3, seed=None, agents=2):
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    if not 1 <= regions <= MAX_REGIONS:
+        raise ValueError(f"A world can have 1 to {MAX_REGIONS} regions, not {regions}.")
+    if not 0 <= goals <= len(world.World.GOAL_CELLS):
+        raise ValueError(f"A world can have 0 to {len(world.World.GOAL_CELLS)} goals, not {goals}.")
+    if not 1 <= agents <= len(world.World.AGENT_NAMES):
+        raise ValueError(f"A world can have 1 to {len(world.World.AGENT_NAMES)} agents, not {agents}.")
+
+    rng = random.Random(seed)
+    cells = bytearray([WALL]) * (width * height)
+    parts = split_regions(width, height, regions)
+    if parts[0].width < 1 or parts[0].height < 1:
+        raise ValueError(f"A {width}x{height} world is too small for {regions} regions.")
+
+    for region in parts:
+        match layout:
+            case 'maze':
+                carve_maze(cells, width, region, rng)
+            case 'rooms':
+                carve_rooms(cells, width, region, rng)
+            case 'open':
+                fill(cells, width, region, FLOOR)
+        region.floor = count_floor(cells, width, region)
+
+    for region, other, (portal, opposite) in zip(parts, parts[1:], PORTALS):
+        place(cells, width, region, portal, rng)
+        place(cells, width, other, opposite, rng)
+    place(cells, width, parts[-1], 'r', rng)
+    for goal in world.World.GOAL_CELLS[:goals]:
+        place(cells, width, rng.choice([region for region in parts if region.floor] or parts), goal, rng)
+
+    if parts[0].floor == 0:
+        raise ValueError("The world is too small for everything that has to be placed in it.")
+    the_world = world.World(f"generated {layout} {width}x{height} seed {seed}")
+    # The agents all start on the same cell, as in the hand-made worlds.
+    # The AIs build one shared map from where they started.
+    x, y = free_cell(cells, width, parts[0], rng)
+    the_world.starts = [(x, y, rng.choice(world.World.DIRECTIONS)) for i in range(agents)]
+    the_world.set_map(width, height, cells)
+    return the_world
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a random world that can always be finished.")
+    parser.add_argument(
+        "output",
+        help=f"world file to write; a name ending in {worldfile.EXTENSION} is written compiled"
+    )
+    parser.add_argument("-s", "--size", type=int, default=64, help="width of the world, outer wall included")
+    parser.add_argument("--height", type=int, default=None, help="height of the world (default: the width)")
+    parser.add_argument("-l", "--layout", choices=LAYOUTS, default='maze', help="layout inside each region")
+    parser.add_argument(
+        "-r", "--regions", type=int, default=1,
+        help=f"number of regions linked by portals, 1 to {MAX_REGIONS}"
+    )
+    parser.add_argument("-g", "--goals", type=int, default=3, help="number of goals, 0 to 10")
+    parser.add_argument("-a", "--agents", type=int, default=2, help="number of agents")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random layout")
+    args = parser.parse_args(argv)
+
+    try:
+        the_world = generate(
+            args.size,
+            args.height or args.size,
+            args.layout,
+            args.regions,
+            args.goals,
+            args.seed,
+            args.agents
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if args.output.endswith(worldfile.EXTENSION):
+        worldfile.write_compiled(the_world, args.output)
+    else:
+        worldfile.write_text(the_world, args.output)
+
+
+if __name__ == "__main__":
+    main()